@@ -0,0 +1,5 @@
+"""Micro-benchmarks of the simulated network components.
+
+Every module can be run on its own, for example:
+poetry run python -m benchmarks.qcs_generator -h
+"""
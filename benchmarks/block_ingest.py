@@ -0,0 +1,62 @@
+"""Throughput of the KME storing the blocks received from the quantum channel.
+
+The local database of the KME is the one of the test configuration, so the blocks are
+rolled back at the end.
+"""
+import asyncio
+import os
+from argparse import Namespace, ArgumentParser
+from time import perf_counter
+from uuid import uuid4
+
+os.environ["env"] = "test"
+
+from qcs import Block  # noqa: E402
+from qcs.generator import BlockGenerator, parse_size  # noqa: E402
+from sd_qkd_node.database import local_db, local_models  # noqa: E402
+from sd_qkd_node.database.dbms import create_from_qcs_block, create_from_qcs_blocks  # noqa: E402
+
+
+async def run(n_blocks: int, lb: int, ub: int, batches: list[int]) -> None:
+    """Stores 'n_blocks' blocks one by one, then in batches of each given size."""
+    generator = BlockGenerator(lb, ub, seed=0)
+    link_id = uuid4()
+    blocks = [Block(0, uuid4(), generator.next_block(), link_id) for _ in range(n_blocks)]
+    await local_db.connect()
+    await local_models.create_all()
+
+    print(f"{n_blocks} blocks of [{lb}, {ub}] B")
+    print(f"{'batch':>8} {'blocks/s':>12} {'MB/s':>10}")
+    mb = sum(len(b.key) for b in blocks) / 10 ** 6
+    for batch in [1] + batches:
+        fresh = [Block(b.time, uuid4(), b.key, b.link_id) for b in blocks]
+        start = perf_counter()
+        if batch == 1:
+            for b in fresh:
+                await create_from_qcs_block(b)
+        else:
+            for i in range(0, n_blocks, batch):
+                await create_from_qcs_blocks(fresh[i:i + batch])
+        elapsed = perf_counter() - start
+        print(f"{batch if batch > 1 else 'none':>8} {n_blocks / elapsed:>12.1f} {mb / elapsed:>10.2f}")
+    await local_db.disconnect()
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.block_ingest")
+    parser.add_argument("-n", "--blocks", type=int, default=2000, help="The number of blocks stored. Default 2000.")
+    parser.add_argument("-lb", "--lowerb", type=str, default="33", help="The block size lower bound. Default 33.")
+    parser.add_argument("-ub", "--upperb", type=str, default="47", help="The block size upper bound. Default 47.")
+    parser.add_argument(
+        "-b", "--batch", type=int, nargs="+", default=[8, 64, 512],
+        help="The sizes of the batches compared with storing the blocks one by one. Default 8 64 512."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    asyncio.run(run(
+        n_blocks=args.blocks, lb=parse_size(args.lowerb), ub=parse_size(args.upperb), batches=args.batch
+    ))
@@ -0,0 +1,101 @@
+"""Size and latency of the blocks table of the KME, with the material as JSON or as raw bytes.
+
+Both tables have the same columns of sd_qkd_node.database.orm.Block, the first with the
+material stored as a JSON list of integers (as done before), the second as a BLOB.
+"""
+import asyncio
+import os
+from argparse import Namespace, ArgumentParser
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from uuid import uuid4
+
+import sqlalchemy
+from databases import Database
+
+from qcs.generator import BlockGenerator, parse_size
+
+
+def blocks_table(material: sqlalchemy.types.TypeEngine) -> sqlalchemy.Table:
+    """The blocks table, with the given type of material."""
+    return sqlalchemy.Table(
+        "blocks", sqlalchemy.MetaData(),
+        sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column("link_id", sqlalchemy.CHAR(32), nullable=False),
+        sqlalchemy.Column("block_id", sqlalchemy.CHAR(32), nullable=False, unique=True),
+        sqlalchemy.Column("timestamp", sqlalchemy.Integer, nullable=False),
+        sqlalchemy.Column("material", material, nullable=False),
+        sqlalchemy.Column("available_bits", sqlalchemy.Integer, nullable=False),
+        sqlalchemy.Column("in_use", sqlalchemy.Integer, nullable=False),
+    )
+
+
+async def measure(
+        name: str, material: sqlalchemy.types.TypeEngine, encode, keys: list[bytes], lookups: int, directory: str
+) -> None:
+    """Stores the keys as blocks, then reads and updates random ones as __get_randbits did."""
+    path = os.path.join(directory, f"{name}.db")
+    table = blocks_table(material)
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    table.metadata.create_all(engine)
+    engine.dispose()
+
+    link_id = uuid4().hex
+    ids: list[str] = [uuid4().hex for _ in keys]
+    async with Database(f"sqlite:///{path}") as db:
+        start = perf_counter()
+        for i in range(0, len(keys), 150):
+            await db.execute(table.insert().values([
+                {
+                    "link_id": link_id, "block_id": block_id, "timestamp": 0, "material": encode(key),
+                    "available_bits": len(key), "in_use": 0
+                } for block_id, key in zip(ids[i:i + 150], keys[i:i + 150])
+            ]))
+        insert = perf_counter() - start
+
+        rng = Random(0)
+        start = perf_counter()
+        for _ in range(lookups):
+            block_id = rng.choice(ids)
+            row = await db.fetch_one(table.select().where(table.c.block_id == block_id))
+            material = row["material"]
+            used = len(material) // 2
+            _ = material[:used]
+            await db.execute(
+                table.update().where(table.c.block_id == block_id).values(available_bits=len(material) - used)
+            )
+        lookup = perf_counter() - start
+
+    size = os.path.getsize(path)
+    key_bytes = sum(len(k) for k in keys)
+    print(
+        f"{name:>6} {size / 10 ** 6:>10.2f} {size / key_bytes:>8.2f} {len(keys) / insert:>12.1f} "
+        f"{lookup / lookups * 10 ** 3:>12.3f}"
+    )
+
+
+async def run(n_blocks: int, lb: int, ub: int, lookups: int) -> None:
+    """Compares the two tables."""
+    generator = BlockGenerator(lb, ub, seed=0)
+    keys = [generator.next_block() for _ in range(n_blocks)]
+    print(f"{n_blocks} blocks of [{lb}, {ub}] B, {lookups} lookups")
+    print(f"{'table':>6} {'size (MB)':>10} {'x key':>8} {'inserts/s':>12} {'lookup (ms)':>12}")
+    with TemporaryDirectory() as directory:
+        await measure("json", sqlalchemy.JSON(), list, keys, lookups, directory)
+        await measure("blob", sqlalchemy.LargeBinary(), bytes, keys, lookups, directory)
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.block_storage")
+    parser.add_argument("-n", "--blocks", type=int, default=2000, help="The number of blocks stored. Default 2000.")
+    parser.add_argument("-lb", "--lowerb", type=str, default="1K", help="The block size lower bound. Default 1K.")
+    parser.add_argument("-ub", "--upperb", type=str, default="4K", help="The block size upper bound. Default 4K.")
+    parser.add_argument("-l", "--lookups", type=int, default=1000, help="The blocks read and updated. Default 1000.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    asyncio.run(run(n_blocks=args.blocks, lb=parse_size(args.lowerb), ub=parse_size(args.upperb), lookups=args.lookups))
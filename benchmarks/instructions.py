@@ -0,0 +1,59 @@
+"""Size and decoding time of the instructions of the keys, stored in JSON or in binary.
+
+The JSON instructions are dumped and loaded with jsons (as done before), the binary ones with
+sd_qkd_node.database.instructions.
+"""
+import json
+import os
+from argparse import Namespace, ArgumentParser
+from random import Random
+from time import perf_counter
+from typing import Callable
+from uuid import UUID
+
+os.environ["env"] = "test"
+
+from sd_qkd_node.database.instructions import Instruction, decode_instructions, encode_instructions  # noqa: E402
+from sd_qkd_node.encoder import dump, load  # noqa: E402
+
+
+def measure(name: str, encode: Callable[[list[Instruction]], object], decode: Callable[[object], object],
+            keys: list[list[Instruction]]) -> None:
+    """Encodes the instructions of the keys, then decodes them."""
+    encoded = [encode(k) for k in keys]
+    start = perf_counter()
+    for e in encoded:
+        decode(e)
+    elapsed = perf_counter() - start
+    size = sum(len(e) for e in encoded) / len(keys)
+    print(f"{name:>6} {size:>12.1f} {len(keys) / elapsed:>14.1f}")
+
+
+def run(n_keys: int, fragments: int, block_size: int) -> None:
+    """Compares the two encodings."""
+    rng = Random(0)
+    keys: list[list[Instruction]] = []
+    for _ in range(n_keys):
+        key: list[Instruction] = []
+        for _ in range(fragments):
+            start = rng.randrange(block_size - 1)
+            key.append(Instruction(UUID(int=rng.getrandbits(128)), start, rng.randrange(start + 1, block_size)))
+        keys.append(key)
+    print(f"{n_keys} keys of {fragments} instructions, on blocks of {block_size} B")
+    print(f"{'format':>6} {'size (B)':>12} {'decodes/s':>14}")
+    measure("json", lambda k: json.dumps(dump(k)), lambda e: load(json.loads(e), tuple[Instruction, ...]), keys)
+    measure("binary", encode_instructions, decode_instructions, keys)
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.instructions")
+    parser.add_argument("-n", "--keys", type=int, default=10000, help="The number of keys. Default 10000.")
+    parser.add_argument("-f", "--fragments", type=int, default=2, help="The instructions of each key. Default 2.")
+    parser.add_argument("-b", "--block", type=int, default=4096, help="The size of the blocks. Default 4096.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    run(n_keys=args.keys, fragments=args.fragments, block_size=args.block)
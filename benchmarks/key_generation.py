@@ -0,0 +1,103 @@
+"""Throughput of the KME cutting keys from the key material, with the keys as base64 strings or as bytes.
+
+Both paths take the material from a KeyPool as dbms does. The first one converts it as done
+before: each key encoded in base64 as soon as it is cut, and decoded back to XOR it with the
+key of the relay. The second one carries the bytes and encodes each key once, when returned.
+"""
+import os
+from argparse import Namespace, ArgumentParser
+from base64 import b64decode, b64encode
+from time import perf_counter
+from typing import Callable
+from uuid import uuid4
+
+os.environ["env"] = "test"
+
+from qcs import Block  # noqa: E402
+from qcs.generator import BlockGenerator, parse_size  # noqa: E402
+from sd_qkd_node.database.pool import KeyPool  # noqa: E402
+from sd_qkd_node.model import Key, RawKey  # noqa: E402
+from sd_qkd_node.utils import encrypt_key, now  # noqa: E402
+
+
+def cut(pool: KeyPool, size: int) -> bytearray:
+    """The material of a key of 'size' bytes, taken from the pool."""
+    key_material = bytearray()
+    for b, start, end in pool.allocate(size, use=False):
+        key_material += pool.material(b, start, end)
+    return key_material
+
+
+def is_base64(s: str) -> bool:
+    bytes_s = bytes(s, "ascii")
+    return bytes_s == b64encode(b64decode(bytes_s))
+
+
+def to_b64(c: bytearray | tuple[int, ...]) -> str:
+    assert all(n in range(0, 256) for n in c)
+    return str(b64encode(bytes(c)), "utf-8")
+
+
+def from_b64(s: str) -> tuple[int, ...]:
+    assert is_base64(s)
+    return tuple(b for b in b64decode(s))
+
+
+def b64_key(pool: KeyPool, size: int, relay: bool) -> Key:
+    """A key cut as before, encrypted with the key of the relay if 'relay'."""
+    key = Key(key_ID=uuid4(), key=to_b64(cut(pool, size)))
+    if relay:
+        enc_key = Key(key_ID=uuid4(), key=to_b64(cut(pool, size)))
+        key_to_encrypt, encryption_key = from_b64(key.key), from_b64(enc_key.key)
+        key = Key(key.key_ID, to_b64(tuple(k ^ e for k, e in zip(key_to_encrypt, encryption_key))))
+    return key
+
+
+def raw_key(pool: KeyPool, size: int, relay: bool) -> Key:
+    """A key cut as bytes, encrypted with the key of the relay if 'relay'."""
+    key = RawKey(key_ID=uuid4(), key=bytes(cut(pool, size)))
+    if relay:
+        key = encrypt_key(key_to_enc=key, enc_key=RawKey(key_ID=uuid4(), key=bytes(cut(pool, size))))
+    return key.encode()
+
+
+def measure(name: str, generate: Callable[[KeyPool, int, bool], Key], blocks: list[bytes], size: int,
+            n_keys: int) -> None:
+    """Cuts 'n_keys' direct keys and 'n_keys' relayed ones of 'size' bytes."""
+    rates: list[float] = []
+    for relay in (False, True):
+        pool = KeyPool(capacity=sum(len(b) for b in blocks))
+        for b in blocks:
+            pool.add(Block(now(), uuid4(), b, uuid4()))
+        start = perf_counter()
+        for _ in range(n_keys):
+            generate(pool, size, relay)
+        rates.append(n_keys / (perf_counter() - start))
+    print(f"{name:>6} {rates[0]:>14.1f} {rates[1]:>14.1f}")
+
+
+def run(n_keys: int, size: int, lb: int, ub: int) -> None:
+    """Compares the two paths."""
+    generator = BlockGenerator(lb, ub, seed=0)
+    blocks: list[bytes] = []
+    while sum(len(b) for b in blocks) < 2 * n_keys * size:
+        blocks.append(generator.next_block())
+    print(f"{n_keys} keys of {size} B, from blocks of [{lb}, {ub}] B")
+    print(f"{'keys':>6} {'direct (k/s)':>14} {'relay (k/s)':>14}")
+    measure("b64", b64_key, blocks, size, n_keys)
+    measure("bytes", raw_key, blocks, size, n_keys)
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.key_generation")
+    parser.add_argument("-n", "--keys", type=int, default=20000, help="The number of keys cut. Default 20000.")
+    parser.add_argument("-s", "--size", type=str, default="32", help="The size of the keys. Default 32 (bytes).")
+    parser.add_argument("-lb", "--lowerb", type=str, default="64K", help="The block size lower bound. Default 64K.")
+    parser.add_argument("-ub", "--upperb", type=str, default="256K", help="The block size upper bound. Default 256K.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    run(n_keys=args.keys, size=parse_size(args.size), lb=parse_size(args.lowerb), ub=parse_size(args.upperb))
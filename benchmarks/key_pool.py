@@ -0,0 +1,61 @@
+"""Throughput of KeyPool.allocate(), with more and more blocks in the pool.
+
+The keys are taken as dbms does, only from the blocks owned by this KME, half of them.
+"""
+import os
+from argparse import Namespace, ArgumentParser
+from random import Random
+from time import perf_counter
+from uuid import UUID, uuid4
+
+os.environ["env"] = "test"
+
+from qcs import Block  # noqa: E402
+from qcs.generator import parse_size  # noqa: E402
+from sd_qkd_node.database.pool import KeyPool  # noqa: E402
+from sd_qkd_node.utils import now  # noqa: E402
+
+
+def owned(block_id: UUID) -> bool:
+    return block_id.int % 2 == 0
+
+
+def measure(n_blocks: int, n_keys: int, size: int, lb: int, ub: int) -> None:
+    """Takes 'n_keys' keys of 'size' bytes from a pool of 'n_blocks' blocks."""
+    rng = Random(0)
+    lengths = [rng.randint(lb, ub) for _ in range(n_blocks)]
+    pool = KeyPool(capacity=sum(lengths))
+    for length in lengths:
+        pool.add(Block(now(), uuid4(), bytes(length), uuid4()))
+    start = perf_counter()
+    taken = 0
+    while taken < n_keys and pool.allocate(size, use=True, owned=owned) is not None:
+        taken += 1
+    elapsed = perf_counter() - start
+    print(f"{n_blocks:>8} {taken:>8} {taken / elapsed:>12.1f}")
+
+
+def run(blocks: list[int], n_keys: int, size: int, lb: int, ub: int) -> None:
+    """Measures the pools of the given numbers of blocks."""
+    print(f"Keys of {size} B, from blocks of [{lb}, {ub}] B")
+    print(f"{'blocks':>8} {'keys':>8} {'keys/s':>12}")
+    for n_blocks in blocks:
+        measure(n_blocks, n_keys, size, lb, ub)
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.key_pool")
+    parser.add_argument("-b", "--blocks", type=int, nargs="+", default=[1000, 5000, 25000],
+                        help="The numbers of blocks in the pool. Default 1000 5000 25000.")
+    parser.add_argument("-n", "--keys", type=int, default=5000, help="The most keys taken. Default 5000.")
+    parser.add_argument("-s", "--size", type=str, default="32", help="The size of the keys. Default 32 (bytes).")
+    parser.add_argument("-lb", "--lowerb", type=str, default="16", help="The block size lower bound. Default 16.")
+    parser.add_argument("-ub", "--upperb", type=str, default="256", help="The block size upper bound. Default 256.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    run(blocks=args.blocks, n_keys=args.keys, size=parse_size(args.size), lb=parse_size(args.lowerb),
+        ub=parse_size(args.upperb))
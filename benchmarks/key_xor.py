@@ -0,0 +1,70 @@
+"""Throughput of the relay encrypting the keys of a KeyContainer with the key of the relay.
+
+Each key is encrypted with its own slice of the key of the relay. The keys are XORed byte by
+byte (as done before), one at a time as integers (as sd_qkd_node.utils.encrypt_key does), and
+all together with sd_qkd_node.utils.encrypt_keys.
+"""
+import os
+from argparse import Namespace, ArgumentParser
+from time import perf_counter
+from typing import Callable
+from uuid import uuid4
+
+os.environ["env"] = "test"
+
+from qcs.generator import parse_size  # noqa: E402
+from sd_qkd_node.model import RawKey  # noqa: E402
+from sd_qkd_node.utils import encrypt_keys  # noqa: E402
+
+
+def bytewise(keys: list[RawKey], enc_key: RawKey) -> list[RawKey]:
+    size = len(enc_key.key) // len(keys)
+    return [
+        RawKey(k.key_ID, bytes(a ^ b for a, b in zip(k.key, enc_key.key[i * size:(i + 1) * size], strict=True)))
+        for i, k in enumerate(keys)
+    ]
+
+
+def per_key(keys: list[RawKey], enc_key: RawKey) -> list[RawKey]:
+    size = len(enc_key.key) // len(keys)
+    return [
+        RawKey(k.key_ID, (
+            int.from_bytes(k.key, "big") ^ int.from_bytes(enc_key.key[i * size:(i + 1) * size], "big")
+        ).to_bytes(size, "big"))
+        for i, k in enumerate(keys)
+    ]
+
+
+def measure(name: str, encrypt: Callable[[list[RawKey], RawKey], list[RawKey]], containers: int, number: int,
+            size: int) -> None:
+    """Encrypts 'containers' KeyContainer of 'number' keys of 'size' bytes."""
+    batches = [[RawKey(uuid4(), os.urandom(size)) for _ in range(number)] for _ in range(containers)]
+    enc_key = RawKey(uuid4(), os.urandom(size * number))
+    start = perf_counter()
+    for keys in batches:
+        encrypt(keys, enc_key)
+    elapsed = perf_counter() - start
+    print(f"{name:>10} {containers * number / elapsed:>14.1f} {containers * number * size / elapsed / 10 ** 6:>10.2f}")
+
+
+def run(containers: int, number: int, size: int) -> None:
+    """Compares the three ways."""
+    print(f"{containers} containers of {number} keys of {size} B")
+    print(f"{'xor':>10} {'keys/s':>14} {'MB/s':>10}")
+    measure("bytewise", bytewise, containers, number, size)
+    measure("per key", per_key, containers, number, size)
+    measure("batch", encrypt_keys, containers, number, size)
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.key_xor")
+    parser.add_argument("-c", "--containers", type=int, default=2000, help="The containers encrypted. Default 2000.")
+    parser.add_argument("-n", "--number", type=int, default=16, help="The keys of each container. Default 16.")
+    parser.add_argument("-s", "--size", type=str, default="32", help="The size of the keys. Default 32 (bytes).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    run(containers=args.containers, number=args.number, size=parse_size(args.size))
@@ -0,0 +1,64 @@
+"""Throughput of the QCS block generator, per simulated link."""
+from argparse import Namespace, ArgumentParser
+from random import getrandbits, randint
+from time import perf_counter
+
+from qcs.generator import BlockGenerator, DISTRIBUTIONS, parse_size
+
+
+def legacy_block(lb: int, ub: int) -> tuple[int, ...]:
+    """The generation of a block as done before the BlockGenerator, one call per byte."""
+    return tuple(getrandbits(8) for _ in range(randint(lb, ub)))
+
+
+def run(links: int, lb: int, ub: int, distribution: str, duration: float, batch: int, legacy: bool) -> None:
+    """Generates blocks for all the links in round-robin for 'duration' seconds."""
+    generators = [BlockGenerator(lb, ub, distribution=distribution) for _ in range(links)]
+    blocks = [0] * links
+    sizes = [0] * links
+    elapsed = [0.0] * links
+    deadline = perf_counter() + duration
+    while perf_counter() < deadline:
+        for i, generator in enumerate(generators):
+            start = perf_counter()
+            if legacy:
+                new_blocks = [bytes(legacy_block(lb, ub)) for _ in range(batch)]
+            elif batch > 1:
+                new_blocks = generator.next_blocks(batch)
+            else:
+                new_blocks = [generator.next_block()]
+            elapsed[i] += perf_counter() - start
+            blocks[i] += len(new_blocks)
+            sizes[i] += sum(len(b) for b in new_blocks)
+
+    print(f"{'legacy' if legacy else 'BlockGenerator'}, {distribution} sizes in [{lb}, {ub}] B, batch {batch}")
+    print(f"{'link':>6} {'blocks':>10} {'blocks/s':>12} {'MB/s':>10} {'Mbit/s':>10}")
+    for i in range(links):
+        mb = sizes[i] / 10 ** 6
+        print(
+            f"{i:>6} {blocks[i]:>10} {blocks[i] / elapsed[i]:>12.1f} "
+            f"{mb / elapsed[i]:>10.2f} {mb * 8 / elapsed[i]:>10.2f}"
+        )
+
+
+def read_args() -> Namespace:
+    """Read parameters from CLI."""
+    parser = ArgumentParser(prog="poetry run python -m benchmarks.qcs_generator")
+    parser.add_argument("-n", "--links", type=int, default=4, help="The number of simulated links. Default 4.")
+    parser.add_argument("-lb", "--lowerb", type=str, default="512K", help="The block size lower bound. Default 512K.")
+    parser.add_argument("-ub", "--upperb", type=str, default="1M", help="The block size upper bound. Default 1M.")
+    parser.add_argument("-d", "--distribution", type=str, choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("-t", "--time", type=float, default=5, help="The duration in seconds. Default 5.")
+    parser.add_argument("-b", "--batch", type=int, default=1, help="Blocks generated per call. Default 1.")
+    parser.add_argument(
+        "--legacy", action="store_true", help="Measure the previous getrandbits generation, for comparison."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = read_args()
+    run(
+        links=args.links, lb=parse_size(args.lowerb), ub=parse_size(args.upperb), distribution=args.distribution,
+        duration=args.time, batch=args.batch, legacy=args.legacy
+    )
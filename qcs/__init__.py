@@ -1,3 +1,4 @@
 from qcs.model.block import Block
+from qcs.model.kme import KME
 
-__all__ = ["Block"]
+__all__ = ["Block", "KME"]
@@ -3,25 +3,15 @@ import configparser
 import logging
 import os
 from argparse import Namespace, ArgumentParser
-from asyncio import open_connection, sleep, run
-from dataclasses import dataclass
-from datetime import datetime
-from struct import pack
-from typing import Final
+from asyncio import run, gather
 from uuid import uuid4
 
-import numpy
-from jsons import dumps
-
-from qcs import Block
-
-
-@dataclass
-class KME:
-    """A KME (host, port) couple."""
-
-    host: str
-    port: int
+from qcs import KME
+from qcs.generator import BlockGenerator, DISTRIBUTIONS, parse_size
+from qcs.link import Link
+from qcs.protocol import BINARY, FORMATS
+from qcs.recording import Recorder, Recording, recording_path
+from qcs.topology import read_links
 
 
 KME_A = KME("localhost", 8000)
@@ -29,46 +19,13 @@ KME_B = KME("localhost", 8001)
 KMEs = (KME_A, KME_B)
 
 DEBUG: bool = True
-GEN_INTERVAL: int = 1
+GEN_INTERVAL: float = 1
 LINK_ID = uuid4()
+FORMAT: int = BINARY
 
 LB = 0
 UB = 10
-
-
-def timestamp() -> int:
-    """The current integer timestamp."""
-    return int(datetime.now().timestamp())
-
-
-def get_random_bits() -> tuple[int, ...]:
-    """Simulate the generation of a random number of bits.
-
-    More precisely, a random number of bytes, each constituted by 8 random
-    bits, is returned. The randomness is simulated exploiting Python's
-    "random" library.
-
-    :return: a tuple, containing a random number of random bytes.
-    """
-    from random import getrandbits, randint
-    return tuple(getrandbits(8) for _ in range(randint(LB, UB)))
-
-
-async def send(block: Block, kme: KME) -> None:
-    """Send to the key kme a newly-generated block."""
-    _, writer = await open_connection(kme.host, kme.port)
-
-    message: Final[str] = dumps(block, indent=4) + "\n"
-    len_message: Final[int] = len(message)
-
-    writer.write(pack(">I", len_message))
-    await writer.drain()
-
-    writer.write(bytes(message, "utf-8"))
-    await writer.drain()
-
-    writer.close()
-    await writer.wait_closed()
+GENERATOR = BlockGenerator(LB, UB)
 
 
 def set_logging() -> None:
@@ -99,53 +56,153 @@ def read_args() -> Namespace:
         "-i",
         "--interval",
         type=str,
-        help="The generation interval of bytes in seconds. Default 1",
+        help="The generation interval of bytes in seconds, also fractional. Default 1",
         default="1",
     )
     parser.add_argument(
         "-lb",
         "--lowerb",
         type=str,
-        help="The produced Bytes lower bound. Default 33B/s.",
+        help="The produced Bytes lower bound, also as '64K' or '4M'. Default 33B/s.",
         default="33",
     )
     parser.add_argument(
         "-ub",
         "--upperb",
         type=str,
-        help="The produced Bytes upper bound. Default 47B/s",
+        help="The produced Bytes upper bound, also as '64K' or '4M'. Default 47B/s",
         default="47",
     )
+    parser.add_argument(
+        "-d",
+        "--distribution",
+        type=str,
+        choices=DISTRIBUTIONS,
+        help="The distribution of the produced Bytes between the bounds. Default uniform.",
+        default="uniform",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        help="The seed of the produced Bytes. Default none, i.e. os.urandom.",
+        default=None,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=tuple(FORMATS),
+        help="The format the blocks are sent with, if accepted by the KMEs. Default binary.",
+        default="binary",
+    )
+    parser.add_argument(
+        "-t",
+        "--topology",
+        type=str,
+        help="A simulation file (like simulation.ini): all the links in its 'qcs' entry are simulated by this process, "
+             "ignoring -k1 and -k2. Default none.",
+        default=None,
+    )
+    parser.add_argument(
+        "-n",
+        "--network",
+        type=str,
+        help="The network of the topology file whose links are simulated. Default ring.",
+        default="ring",
+    )
+    parser.add_argument(
+        "-r",
+        "--record",
+        type=str,
+        help="A directory where the blocks of each link are recorded, as 'link-<i>.qcsr'. Default none.",
+        default=None,
+    )
+    parser.add_argument(
+        "-p",
+        "--replay",
+        type=str,
+        help="A directory of recordings (see --record) to replay on the same links, instead of generating new blocks. "
+             "Default none.",
+        default=None,
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="The speed of the replay with respect to the recording, 0 to send the blocks as fast as the KMEs can "
+             "take them. Default 1.",
+        default=1,
+    )
 
     return parser.parse_args()
 
 
 # Check Config file for info
-def set_params(kme1: str, kme2: str, interval: str, lb: str, ub: str) -> None:
+def set_params(
+        kme1: str, kme2: str, interval: str, lb: str, ub: str, distribution: str = "uniform", seed: int | None = None,
+        fmt: str = "binary"
+) -> None:
     config = configparser.ConfigParser()
     config.read(os.path.dirname(os.path.abspath(__file__)) + '/config.ini')
-    global KME_A, KME_B, DEBUG, GEN_INTERVAL, KMEs, LB, UB
+    global KME_A, KME_B, DEBUG, GEN_INTERVAL, KMEs, LB, UB, GENERATOR, FORMAT
     KME_A = KME(kme1.split(":")[0], int(kme1.split(":")[1]))
     KME_B = KME(kme2.split(":")[0], int(kme2.split(":")[1]))
     DEBUG = bool(config["SHARED"]["DEBUG"])
-    GEN_INTERVAL = int(interval)
+    GEN_INTERVAL = float(interval)
     KMEs = (KME_A, KME_B)
-    LB = float(lb)
-    UB = float(ub)
+    LB = parse_size(lb)
+    UB = parse_size(ub)
+    GENERATOR = BlockGenerator(LB, UB, distribution=distribution, seed=seed)
+    FORMAT = FORMATS[fmt]
 
 
 async def main() -> None:
     """Main function."""
     set_logging()
     args = read_args()
-    set_params(kme1=args.kme1, kme2=args.kme2, interval=args.interval, lb=args.lowerb, ub=args.upperb)
-
-    while True:
-        await sleep(GEN_INTERVAL)
+    set_params(
+        kme1=args.kme1, kme2=args.kme2, interval=args.interval, lb=args.lowerb, ub=args.upperb,
+        distribution=args.distribution, seed=args.seed, fmt=args.format
+    )
 
-        new_block = Block(timestamp(), uuid4(), get_random_bits(), LINK_ID)
-        for kme in KMEs:
-            await send(new_block, kme)
+    if args.topology is not None:
+        links = read_links(
+            path=args.topology, network=args.network, interval=GEN_INTERVAL, lb=LB, ub=UB,
+            distribution=args.distribution, seed=args.seed, fmt=FORMAT
+        )
+        logging.getLogger("qcs").info(f"Simulating {len(links)} links of {args.network.upper()}")
+    else:
+        links = [Link(kmes=KMEs, generator=GENERATOR, interval=GEN_INTERVAL, fmt=FORMAT, link_id=LINK_ID)]
+
+    if args.replay is not None:
+        await replay(links, args.replay, args.speed)
+        return
+    if args.record is not None:
+        os.makedirs(args.record, exist_ok=True)
+        for i, link in enumerate(links):
+            link.recorder = Recorder(recording_path(args.record, i), link.link_id)
+    await gather(*(link.run() for link in links))
+
+
+async def replay(links: list[Link], directory: str, speed: float) -> None:
+    """Replays on each link its recording in a directory."""
+    recorded: list[tuple[Link, Recording]] = []
+    for i, link in enumerate(links):
+        try:
+            recorded.append((link, Recording(recording_path(directory, i))))
+        except (OSError, ValueError) as e:
+            logging.getLogger("qcs").error(f"{link}: not replayed, {e}")
+    recordings = [recording for _, recording in recorded]
+    # the blocks are sent again on the recorded links, so they must keep the recorded ids
+    replayed = [
+        Link(kmes=link.kmes, generator=link.generator, interval=link.interval, fmt=FORMAT, link_id=recording.link_id)
+        for link, recording in recorded
+    ]
+    await gather(*(link.replay(recording, speed) for link, recording in zip(replayed, recordings)))
+    for link, recording in zip(replayed, recordings):
+        logging.getLogger("qcs").info(f"{link}: replayed {link.sent} blocks")
+        await link.close()
+        recording.close()
 
 
 if __name__ == "__main__":
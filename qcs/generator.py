@@ -0,0 +1,93 @@
+"""Generation of the random material produced by the quantum channel."""
+import os
+from typing import Final
+
+import numpy
+
+DISTRIBUTIONS: Final[tuple[str, ...]] = ("uniform", "normal", "poisson", "constant")
+
+# Sizes of the blocks are drawn in batches, so that numpy is called once every SIZE_BATCH blocks.
+SIZE_BATCH: Final[int] = 1024
+
+_UNITS: Final[dict[str, int]] = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(size: str) -> int:
+    """Converts a size like '47', '64K' or '4M' into a number of bytes."""
+    size = size.strip().upper().removesuffix("B")
+    unit = size[-1] if size and size[-1] in _UNITS else ""
+    return int(float(size[:len(size) - len(unit)]) * _UNITS[unit])
+
+
+class BlockGenerator:
+    """Simulate the generation of blocks of random bytes.
+
+    The size of each block is drawn from the given distribution between 'lower' and
+    'upper' bytes:
+    - "uniform", every size in [lower, upper] is equally likely;
+    - "normal", sizes are centered in the middle of the interval, which covers 6 sigmas;
+    - "poisson", sizes follow a Poisson distribution with mean in the middle of the interval;
+    - "constant", every block is 'upper' bytes long.
+
+    Sizes are always clipped to [lower, upper]. The random bytes come from os.urandom,
+    unless a seed is given: in that case numpy's generator is exploited, so that the
+    same seed and the same sequence of calls always produce the same stream of blocks.
+    """
+
+    def __init__(self, lower: int, upper: int, distribution: str = "uniform", seed: int | None = None) -> None:
+        if not 0 <= lower <= upper:
+            raise ValueError(f"Invalid block size bounds [{lower}, {upper}]")
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution '{distribution}', expected one of {DISTRIBUTIONS}")
+        self.lower = lower
+        self.upper = upper
+        self.distribution = distribution
+        self.seed = seed
+        size_seed, bytes_seed = numpy.random.SeedSequence(seed).spawn(2)
+        self.__size_rng = numpy.random.default_rng(size_seed)
+        self.__bytes_rng = numpy.random.default_rng(bytes_seed)
+        self.__sizes: list[int] = []
+
+    @property
+    def mean_size(self) -> float:
+        """The expected size of a block in bytes."""
+        return float(self.upper) if self.distribution == "constant" else (self.lower + self.upper) / 2
+
+    def __draw_sizes(self, n: int) -> numpy.ndarray:
+        """Draws the sizes of the next 'n' blocks."""
+        match self.distribution:
+            case "uniform":
+                sizes = self.__size_rng.integers(self.lower, self.upper, size=n, endpoint=True)
+            case "normal":
+                sizes = numpy.rint(self.__size_rng.normal(self.mean_size, (self.upper - self.lower) / 6, size=n))
+            case "poisson":
+                sizes = self.__size_rng.poisson(self.mean_size, size=n)
+            case _:
+                sizes = numpy.full(n, self.upper)
+        return numpy.clip(sizes, self.lower, self.upper).astype(numpy.int64)
+
+    def __random_bytes(self, n: int) -> bytes:
+        """Returns 'n' random bytes."""
+        return os.urandom(n) if self.seed is None else self.__bytes_rng.bytes(n)
+
+    def next_size(self) -> int:
+        """Returns the size of the next block."""
+        if not self.__sizes:
+            # reversed, so that pop() returns them in the order they were drawn
+            self.__sizes = self.__draw_sizes(SIZE_BATCH).tolist()[::-1]
+        return self.__sizes.pop()
+
+    def next_block(self) -> bytes:
+        """Returns a new block of random bytes."""
+        return self.__random_bytes(self.next_size())
+
+    def next_blocks(self, n: int) -> list[bytes]:
+        """Returns 'n' new blocks of random bytes, drawing all their material at once."""
+        sizes = [self.next_size() for _ in range(n)]
+        material = memoryview(self.__random_bytes(sum(sizes)))
+        blocks: list[bytes] = []
+        offset = 0
+        for size in sizes:
+            blocks.append(bytes(material[offset:offset + size]))
+            offset += size
+        return blocks
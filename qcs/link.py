@@ -0,0 +1,156 @@
+"""A link of the quantum channel, delivering the same blocks to its two KMEs."""
+import asyncio
+import logging
+from asyncio import Task
+from dataclasses import replace
+from datetime import datetime
+from typing import Final
+from uuid import UUID, uuid4
+
+from qcs.generator import BlockGenerator
+from qcs.model.block import Block
+from qcs.model.kme import KME
+from qcs.protocol import BINARY
+from qcs.recording import Recorder, Recording
+from qcs.stream import KMEStream
+
+# If the link is late by more than MAX_LAG generation intervals, the late blocks are skipped
+# instead of being generated all at once.
+MAX_LAG: Final[int] = 10
+
+
+def timestamp() -> int:
+    """The current integer timestamp."""
+    return int(datetime.now().timestamp())
+
+
+class Link:
+    """A link of the quantum channel.
+
+    A new block is generated every 'interval' seconds, on an absolute cadence: the
+    n-th block is due 'n * interval' seconds after the link started, whatever the time
+    spent to send the previous ones. Each block is sent to both KMEs concurrently, and
+    must reach them before the next one is due: if it does not, the missed deadline is
+    reported and counted in 'missed', but the cadence is kept and the companion KME is
+    not delayed.
+
+    While a KME pauses its stream, because it has too much unconsumed material, no block
+    is generated: the cadence restarts when all the streams are resumed, and the time
+    spent paused is counted in 'paused'.
+
+    If a recorder is given, the generated blocks are also recorded, so that the same
+    stream can be replayed later.
+    """
+
+    def __init__(
+            self, kmes: tuple[KME, KME], generator: BlockGenerator, interval: float, fmt: int = BINARY,
+            link_id: UUID | None = None, recorder: Recorder | None = None
+    ) -> None:
+        self.link_id = link_id if link_id is not None else uuid4()
+        self.kmes = kmes
+        self.recorder = recorder
+        self.generator = generator
+        self.interval = interval
+        self.streams = tuple(KMEStream(kme, self.link_id, fmt=fmt) for kme in kmes)
+        self.sent = 0
+        self.missed: dict[KMEStream, int] = {stream: 0 for stream in self.streams}
+        self.skipped = 0
+        self.paused = 0.0
+        self.__sending: set[Task[None]] = set()
+
+    def __str__(self) -> str:
+        return f"link {' <-> '.join(f'{s.kme.host}:{s.kme.port}' for s in self.streams)}"
+
+    def new_block(self) -> Block:
+        """Generates the next block of the link."""
+        return Block(timestamp(), uuid4(), self.generator.next_block(), self.link_id)
+
+    async def run(self) -> None:
+        """Generates and sends the blocks of the link forever."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tick = 0
+        while True:
+            start += await self.wait_resumed()
+            tick += 1
+            deadline = start + tick * self.interval
+            if (lag := int((loop.time() - deadline) / self.interval)) > MAX_LAG:
+                self.skipped += lag
+                tick += lag
+                deadline += lag * self.interval
+                logging.getLogger("qcs").warning(f"{self} late, skipped {lag} blocks")
+            await asyncio.sleep(deadline - loop.time())
+            block = self.new_block()
+            if self.recorder is not None:
+                self.recorder.write(block, deadline - start)
+            await self.send(block, deadline=deadline + self.interval)
+
+    async def wait_resumed(self) -> float:
+        """Waits until no KME pauses its stream, returning the time spent paused."""
+        loop = asyncio.get_running_loop()
+        paused_at = loop.time()
+        while any(stream.paused for stream in self.streams):
+            await asyncio.gather(*(stream.wait_resumed() for stream in self.streams))
+        self.paused += loop.time() - paused_at
+        return loop.time() - paused_at
+
+    async def replay(self, recording: Recording, speed: float = 1) -> None:
+        """Sends the blocks of a recording of this link, then returns.
+
+        The blocks keep their recorded cadence, scaled by 'speed' (e.g. 2 sends them twice
+        as fast). With speed 0 they are sent as fast as the KMEs store them. As when
+        generating blocks, the cadence restarts after the KMEs pause the streams. The blocks
+        keep their id and their key, but are stamped with the time they are sent again, so the
+        KMEs do not take them as expired.
+        """
+        start = asyncio.get_running_loop().time()
+        pending: tuple[float, Block] | None = None
+        for offset, block in recording:
+            if pending is not None:
+                start = await self.__replay(start, pending, offset, speed)
+            pending = offset, block
+        if pending is not None:
+            await self.__replay(start, pending, pending[0] + self.interval, speed)
+
+    async def __replay(self, start: float, record: tuple[float, Block], next_offset: float, speed: float) -> float:
+        """Sends a recorded block when due, waiting for it until the next one is due.
+
+        Returns the start of the replay, moved forward by the time spent paused.
+        """
+        offset, recorded = record
+        start += await self.wait_resumed()
+        if speed == 0:
+            # a block is sent only once both KMEs acknowledged enough of the previous ones, not to drop any
+            await asyncio.gather(*(stream.wait_credit() for stream in self.streams))
+            await self.send(replace(recorded, time=timestamp()), deadline=None)
+            return start
+        await asyncio.sleep(start + offset / speed - asyncio.get_running_loop().time())
+        await self.send(replace(recorded, time=timestamp()), deadline=start + next_offset / speed)
+        return start
+
+    async def send(self, block: Block, deadline: float | None) -> None:
+        """Sends the block to both KMEs, waiting for them at most until the deadline, if any.
+
+        The sends that miss the deadline are not cancelled, they keep going in background.
+        """
+        loop = asyncio.get_running_loop()
+        sends = {asyncio.create_task(stream.send(block)): stream for stream in self.streams}
+        self.sent += 1
+        timeout = None if deadline is None else max(0.0, deadline - loop.time())
+        _, late = await asyncio.wait(sends, timeout=timeout)
+        for task in late:
+            stream = sends[task]
+            self.missed[stream] += 1
+            logging.getLogger("qcs").warning(
+                f"{self}: block {self.sent} missed its deadline on {stream.kme.host}:{stream.kme.port} "
+                f"({self.missed[stream]}/{self.sent} missed)"
+            )
+            self.__sending.add(task)
+            task.add_done_callback(self.__sending.discard)
+
+    async def close(self) -> None:
+        """Closes the streams and the recorder of the link."""
+        for stream in self.streams:
+            await stream.close()
+        if self.recorder is not None:
+            self.recorder.close()
@@ -8,5 +8,5 @@ class Block:
 
     time: int
     id: UUID
-    key: tuple[int, ...]
+    key: bytes
     link_id: UUID
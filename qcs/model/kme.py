@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class KME:
+    """A KME (host, port) couple."""
+
+    host: str
+    port: int
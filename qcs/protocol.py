@@ -0,0 +1,89 @@
+"""The protocol exploited by the quantum channel to deliver blocks to the KMEs.
+
+A QCS keeps a long-lived stream open with each KME of its link:
+1. the QCS opens the stream sending HELLO, that is MAGIC followed by the link id and
+   the format it would like to encode the blocks with;
+2. the KME replies with HELLO_REPLY, the sequence number of the last block it received
+   on that link (0 if none) and the format it accepts, which is the one of all the
+   blocks of the stream. Thanks to the sequence number, the QCS can resume the stream
+   re-sending only the blocks that were lost while disconnected;
+3. the QCS sends each block as a frame, made of FRAME_HEADER (length of the payload and
+   sequence number, starting from 1) followed by the encoded block;
+4. the KME answers with CONTROL messages, e.g. ACK carrying the sequence number of the
+   last block it stored. When too much of its material is still unconsumed, the KME
+   sends PAUSE, and the QCS stops generating blocks on the link until RESUME. Both carry
+   the sequence number of the last block stored.
+
+Older QCSs open a connection for every block and only send LEGACY_HEADER (the length of
+the payload) followed by the block encoded in JSON: since MAGIC is not a plausible
+length, the KME can always tell the two apart from the first 4 bytes.
+
+A block is encoded either:
+- in BINARY, that is BLOCK_HEADER (version, timestamp, id and link id) followed by the
+  raw bytes of the key;
+- in JSON, with the key as a list of integers, as done by older QCSs.
+"""
+from dataclasses import dataclass
+from struct import Struct
+from typing import Final, Optional
+from uuid import UUID
+
+from jsons import dumps, loads
+
+from qcs.model.block import Block
+
+MAGIC: Final[bytes] = b"QCS\x01"
+
+HELLO: Final[Struct] = Struct(">4s16sB")
+HELLO_REPLY: Final[Struct] = Struct(">QB")
+FRAME_HEADER: Final[Struct] = Struct(">IQ")
+LEGACY_HEADER: Final[Struct] = Struct(">I")
+CONTROL: Final[Struct] = Struct(">BQ")
+
+# Types of CONTROL messages
+ACK: Final[int] = 1
+PAUSE: Final[int] = 2
+RESUME: Final[int] = 3
+
+# Formats of the blocks
+JSON: Final[int] = 0
+BINARY: Final[int] = 1
+FORMATS: Final[dict[str, int]] = {"json": JSON, "binary": BINARY}
+
+BLOCK_VERSION: Final[int] = 1
+BLOCK_HEADER: Final[Struct] = Struct(">BQ16s16s")
+
+
+@dataclass(frozen=True, slots=True)
+class JsonBlock:
+    """A block encoded in JSON, where the key is a list of integers in [0, 255].
+
+    The link id can be missing if the block comes from an older QCS (Optional, since
+    jsons does not deserialize "UUID | None").
+    """
+
+    time: int
+    id: UUID
+    key: tuple[int, ...]
+    link_id: Optional[UUID] = None
+
+
+def encode_block(block: Block, fmt: int) -> bytes:
+    """Encodes a block in the given format."""
+    if fmt == BINARY:
+        return BLOCK_HEADER.pack(BLOCK_VERSION, block.time, block.id.bytes, block.link_id.bytes) + block.key
+    return bytes(dumps(JsonBlock(block.time, block.id, tuple(block.key), block.link_id), indent=4) + "\n", "utf-8")
+
+
+def decode_block(data: bytes, fmt: int) -> Block:
+    """Decodes a block encoded in the given format.
+
+    The link id of a block in JSON is None if it was not sent.
+    """
+    if fmt == BINARY:
+        version, time, block_id, link_id = BLOCK_HEADER.unpack_from(data)
+        if version != BLOCK_VERSION:
+            raise ValueError(f"Unsupported block version {version}")
+        return Block(time=time, id=UUID(bytes=block_id), key=data[BLOCK_HEADER.size:], link_id=UUID(bytes=link_id))
+    json_block: JsonBlock = loads(data.decode(), JsonBlock, strict=True)
+    return Block(time=json_block.time, id=json_block.id, key=bytes(json_block.key), link_id=json_block.link_id)
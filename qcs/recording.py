@@ -0,0 +1,86 @@
+"""Recording of the blocks of a link, to replay the very same stream in later runs.
+
+A recording is an append-only file made of FILE_HEADER (RECORD_MAGIC, version and
+link id) followed by one record per block: RECORD_HEADER (the time the block was due,
+in seconds since the link started, and the length of the block) followed by the block
+encoded in BINARY. A record cut short, e.g. by the QCS being killed, is ignored.
+"""
+import mmap
+import os
+from collections.abc import Iterator
+from struct import Struct
+from typing import Final, BinaryIO
+from uuid import UUID
+
+from qcs.model.block import Block
+from qcs.protocol import BINARY, encode_block, decode_block
+
+RECORD_MAGIC: Final[bytes] = b"QCSR"
+RECORD_VERSION: Final[int] = 1
+
+FILE_HEADER: Final[Struct] = Struct(">4sB16s")
+RECORD_HEADER: Final[Struct] = Struct(">dI")
+
+
+def recording_path(directory: str, index: int) -> str:
+    """The recording of the index-th link of the QCS in a directory."""
+    return os.path.join(directory, f"link-{index}.qcsr")
+
+
+class Recorder:
+    """Appends the blocks of a link to a new recording, replacing the file if it exists."""
+
+    def __init__(self, path: str, link_id: UUID) -> None:
+        self.path = path
+        self.__file: BinaryIO = open(path, "wb")
+        self.__file.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, link_id.bytes))
+        self.__file.flush()
+
+    def write(self, block: Block, offset: float) -> None:
+        """Appends a block, due 'offset' seconds after the link started."""
+        data = encode_block(block, BINARY)
+        self.__file.write(RECORD_HEADER.pack(offset, len(data)) + data)
+        self.__file.flush()
+
+    def close(self) -> None:
+        """Closes the recording."""
+        self.__file.close()
+
+
+class Recording:
+    """A recording of the blocks of a link, memory-mapped to be read."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            # checked before mapping it, since an empty file cannot be mapped
+            if os.fstat(file.fileno()).st_size < FILE_HEADER.size:
+                raise ValueError(f"{path} is not a recording of blocks, or it is truncated")
+            self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, link_id = FILE_HEADER.unpack_from(self.__map)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a recording of blocks, or its version is not supported")
+        self.link_id = UUID(bytes=link_id)
+
+    def __enter__(self) -> "Recording":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[tuple[float, Block]]:
+        """The recorded blocks, each with the time it was due since the link started."""
+        position = FILE_HEADER.size
+        end = len(self.__map)
+        while position + RECORD_HEADER.size <= end:
+            offset, length = RECORD_HEADER.unpack_from(self.__map, position)
+            position += RECORD_HEADER.size
+            if position + length > end:
+                return
+            yield offset, decode_block(self.__map[position:position + length], BINARY)
+            position += length
+
+    def close(self) -> None:
+        """Releases the mapping of the file."""
+        self.__map.close()
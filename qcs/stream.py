@@ -0,0 +1,173 @@
+"""A long-lived stream of blocks from the quantum channel to a KME."""
+import asyncio
+import logging
+from asyncio import StreamReader, StreamWriter, IncompleteReadError, Task
+from collections import deque
+from typing import Final
+from uuid import UUID
+
+from qcs.model.block import Block
+from qcs.model.kme import KME
+from qcs.protocol import MAGIC, HELLO, HELLO_REPLY, FRAME_HEADER, CONTROL, ACK, PAUSE, RESUME, BINARY, encode_block
+
+MIN_RETRY_DELAY: Final[float] = 0.1
+MAX_RETRY_DELAY: Final[float] = 5
+
+
+class KMEStream:
+    """The stream on which the blocks of a link are sent to one of its KMEs.
+
+    The connection is opened at the first block and kept open. If it drops, it is
+    re-opened at the next block (at most once every retry delay, which grows up to
+    MAX_RETRY_DELAY), and the blocks not acknowledged by the KME are sent again.
+    At most 'buffer_size' blocks are kept waiting for an acknowledgement: older ones
+    are lost if the KME stays unreachable for longer.
+
+    The blocks are encoded in the format accepted by the KME when the stream is opened,
+    which is the preferred 'fmt' if the KME supports it.
+
+    The KME can pause the stream when it has too much unconsumed material: the stream
+    is resumed when the KME asks to, or when the connection drops.
+    """
+
+    def __init__(self, kme: KME, link_id: UUID, fmt: int = BINARY, buffer_size: int = 1024) -> None:
+        self.kme = kme
+        self.link_id = link_id
+        self.preferred_format = fmt
+        self.format = fmt
+        self.__seq = 0
+        self.__unacked: deque[tuple[int, Block]] = deque()
+        self.__buffer_size = buffer_size
+        self.__reader: StreamReader | None = None
+        self.__writer: StreamWriter | None = None
+        self.__control_task: Task[None] | None = None
+        self.__lock = asyncio.Lock()
+        self.__retry_delay = MIN_RETRY_DELAY
+        self.__next_retry = 0.0
+        self.__resumed = asyncio.Event()
+        self.__resumed.set()
+        # set when a block can be sent without dropping one not acknowledged yet, or the stream dropped
+        self.__credit = asyncio.Event()
+        self.__credit.set()
+
+    @property
+    def connected(self) -> bool:
+        """True if the stream towards the KME is open."""
+        return self.__writer is not None
+
+    @property
+    def paused(self) -> bool:
+        """True if the KME asked not to send new blocks for now."""
+        return not self.__resumed.is_set()
+
+    async def wait_resumed(self) -> None:
+        """Waits until the stream is not paused."""
+        await self.__resumed.wait()
+
+    async def wait_credit(self) -> None:
+        """Waits until a new block can be sent without dropping one not acknowledged yet.
+
+        While the stream is closed, it waits only until it can be re-opened by the next block.
+        """
+        loop = asyncio.get_running_loop()
+        while len(self.__unacked) >= self.__buffer_size:
+            if self.__writer is None:
+                await asyncio.sleep(max(0.0, self.__next_retry - loop.time()))
+                return
+            self.__credit.clear()
+            await self.__credit.wait()
+
+    async def send(self, block: Block) -> None:
+        """Sends a block to the KME, or buffers it if the KME cannot be reached."""
+        self.__seq += 1
+        self.__unacked.append((self.__seq, block))
+        if len(self.__unacked) > self.__buffer_size:
+            lost, _ = self.__unacked.popleft()
+            logging.getLogger("qcs").warning(f"Block {lost} to {self.kme.host}:{self.kme.port} lost")
+        async with self.__lock:
+            if self.__writer is None:
+                # connecting re-sends all the blocks not acknowledged, including this one
+                await self.__connect()
+                return
+            try:
+                self.__writer.write(self.__frame(self.__seq, block))
+                await self.__writer.drain()
+            except (ConnectionError, OSError):
+                self.__disconnect()
+
+    async def close(self) -> None:
+        """Closes the stream."""
+        async with self.__lock:
+            writer = self.__writer
+            self.__disconnect()
+            if writer is not None:
+                try:
+                    await writer.wait_closed()
+                except (ConnectionError, OSError):
+                    pass
+
+    async def __connect(self) -> None:
+        """Opens the stream and resumes it from the last block received by the KME."""
+        loop = asyncio.get_running_loop()
+        if loop.time() < self.__next_retry:
+            return
+        try:
+            self.__reader, self.__writer = await asyncio.open_connection(self.kme.host, self.kme.port)
+            self.__writer.write(HELLO.pack(MAGIC, self.link_id.bytes, self.preferred_format))
+            await self.__writer.drain()
+            last_received, self.format = HELLO_REPLY.unpack(await self.__reader.readexactly(HELLO_REPLY.size))
+            self.__acknowledge(last_received)
+            for seq, block in self.__unacked:
+                self.__writer.write(self.__frame(seq, block))
+            await self.__writer.drain()
+        except (ConnectionError, OSError, IncompleteReadError):
+            self.__disconnect()
+            self.__next_retry = loop.time() + self.__retry_delay
+            self.__retry_delay = min(self.__retry_delay * 2, MAX_RETRY_DELAY)
+            return
+        self.__retry_delay = MIN_RETRY_DELAY
+        self.__control_task = asyncio.create_task(self.__read_control(self.__reader))
+        logging.getLogger("qcs").info(f"Stream to {self.kme.host}:{self.kme.port} open from block {last_received}")
+
+    def __frame(self, seq: int, block: Block) -> bytes:
+        """Encodes a block as a frame of the stream."""
+        payload = encode_block(block, self.format)
+        return FRAME_HEADER.pack(len(payload), seq) + payload
+
+    def __disconnect(self) -> None:
+        """Forgets the current connection, so that the next block re-opens it."""
+        if self.__control_task is not None:
+            self.__control_task.cancel()
+            self.__control_task = None
+        if self.__writer is not None:
+            self.__writer.close()
+        self.__reader = None
+        self.__writer = None
+        # a KME still saturated pauses the stream again when it is re-opened
+        self.__resumed.set()
+        self.__credit.set()
+
+    def __acknowledge(self, seq: int) -> None:
+        """Drops the blocks up to 'seq', since the KME has already stored them."""
+        while self.__unacked and self.__unacked[0][0] <= seq:
+            self.__unacked.popleft()
+        if len(self.__unacked) < self.__buffer_size:
+            self.__credit.set()
+
+    async def __read_control(self, reader: StreamReader) -> None:
+        """Handles the control messages sent back by the KME."""
+        try:
+            while True:
+                kind, value = CONTROL.unpack(await reader.readexactly(CONTROL.size))
+                if kind in (ACK, PAUSE, RESUME):
+                    self.__acknowledge(value)
+                if kind == PAUSE:
+                    logging.getLogger("qcs").info(f"Stream to {self.kme.host}:{self.kme.port} paused by the KME")
+                    self.__resumed.clear()
+                elif kind == RESUME:
+                    logging.getLogger("qcs").info(f"Stream to {self.kme.host}:{self.kme.port} resumed by the KME")
+                    self.__resumed.set()
+        except (ConnectionError, OSError, IncompleteReadError):
+            if self.__reader is reader:
+                self.__control_task = None
+                self.__disconnect()
@@ -0,0 +1,48 @@
+"""The links of a whole network topology, driven by a single quantum channel simulator."""
+import configparser
+
+from qcs.generator import BlockGenerator, parse_size
+from qcs.link import Link
+from qcs.model.kme import KME
+from qcs.protocol import BINARY
+
+DEFAULT_HOST = "127.0.0.1"
+
+
+def parse_kme(address: str) -> KME:
+    """Parses a KME given as 'host:port' or only as 'port', on DEFAULT_HOST."""
+    host, _, port = address.strip().rpartition(":")
+    return KME(host if host else DEFAULT_HOST, int(port))
+
+
+def read_links(
+        path: str, network: str, interval: float, lb: int, ub: int, distribution: str = "uniform",
+        seed: int | None = None, fmt: int = BINARY
+) -> list[Link]:
+    """Reads the links of a network from the 'qcs' entry of a simulation file.
+
+    The links are separated by '/', each one as 'kme1,kme2[,interval,lb,ub]', where
+    the KMEs are given as in parse_kme(). The optional parameters override, for that
+    link only, the given generation interval and bounds of the produced bytes, e.g.:
+    qcs = 8000,8001/8001,8002,0.5,64K,128K
+
+    If a seed is given, the i-th link is seeded with 'seed + i'.
+    """
+    config = configparser.ConfigParser()
+    if not config.read(path):
+        raise FileNotFoundError(path)
+    links: list[Link] = []
+    for i, entry in enumerate(config[network.upper()]["qcs"].split("/")):
+        params = [p.strip() for p in entry.split(",")]
+        if len(params) not in (2, 5):
+            raise ValueError(f"Invalid link '{entry}' in [{network}], expected 'kme1,kme2[,interval,lb,ub]'")
+        link_interval, link_lb, link_ub = interval, lb, ub
+        if len(params) == 5:
+            link_interval, link_lb, link_ub = float(params[2]), parse_size(params[3]), parse_size(params[4])
+        generator = BlockGenerator(
+            link_lb, link_ub, distribution=distribution, seed=None if seed is None else seed + i
+        )
+        links.append(Link(
+            kmes=(parse_kme(params[0]), parse_kme(params[1])), generator=generator, interval=link_interval, fmt=fmt
+        ))
+    return links
@@ -7,7 +7,6 @@ from uvicorn import run
 from sd_qkd_node import kme_app
 from sd_qkd_node.external_api import sdnc_api_new_kme
 from sd_qkd_node.model.new_kme import NewKmeResponse
-from sd_qkd_node.channel.qc_server import QCServer
 from sd_qkd_node.configs import Config
 from sd_qkd_node.strings import set_logging
 
@@ -21,7 +20,6 @@ async def connect_to_controller() -> None:
 
 if __name__ == "__main__":
     set_logging()
-    with QCServer():
-        asyncio.run(connect_to_controller())
-        # noinspection PyTypeChecker
-        run(app=kme_app.app, host=Config.KME_IP, port=Config.SAE_TO_KME_PORT, log_level="warning")
+    asyncio.run(connect_to_controller())
+    # noinspection PyTypeChecker
+    run(app=kme_app.app, host=Config.KME_IP, port=Config.SAE_TO_KME_PORT, log_level="warning")
@@ -0,0 +1,81 @@
+"""Batched storing of the blocks received from the quantum channel."""
+import asyncio
+import logging
+from asyncio import Task
+from collections.abc import Awaitable, Callable
+
+from qcs import Block
+from sd_qkd_node.configs import Config
+from sd_qkd_node.database.dbms import create_from_qcs_blocks
+
+
+class BlockBatch:
+    """Buffers the blocks received on a link, to store them with a single insert.
+
+    The buffered blocks are stored when they reach Config.INGEST_BATCH_SIZE, or
+    Config.INGEST_WINDOW seconds after the first one was buffered. Only once they are
+    stored, 'on_stored' is awaited with the sequence number of the last one and the
+    blocks themselves, e.g. to acknowledge them and report the rate of the link.
+
+    If storing a batch fails, 'failed' is set and no other block is stored: 'on_failed' is
+    called to close the stream, so that the blocks not acknowledged are sent again, instead
+    of acknowledging the following ones past the lost batch.
+    """
+
+    def __init__(
+            self, on_stored: Callable[[int, list[Block]], Awaitable[None]], on_failed: Callable[[], None]
+    ) -> None:
+        self.last_seq = 0
+        self.__on_stored = on_stored
+        self.__on_failed = on_failed
+        self.__blocks: list[Block] = []
+        self.__lock = asyncio.Lock()
+        self.__timer: Task[None] | None = None
+        self.failed: Exception | None = None
+
+    async def add(self, seq: int, block: Block) -> None:
+        """Buffers a block, storing the batch if full. Raises the error of the failed batch, if any."""
+        if self.failed is not None:
+            raise self.failed
+        self.__blocks.append(block)
+        self.last_seq = seq
+        if len(self.__blocks) >= Config.INGEST_BATCH_SIZE:
+            await self.flush()
+        elif self.__timer is None:
+            self.__timer = asyncio.create_task(self.__flush_later())
+
+    async def flush(self) -> None:
+        """Stores the buffered blocks, if any. Raises the error of the failed batch, if any."""
+        self.close()
+        async with self.__lock:
+            if self.failed is not None:
+                raise self.failed
+            blocks, self.__blocks = self.__blocks, []
+            if not blocks:
+                return
+            seq = self.last_seq
+            try:
+                await create_from_qcs_blocks(blocks)
+            except Exception as e:
+                logging.getLogger().error(f"{len(blocks)} blocks from the quantum channel not stored: {e!r}")
+                self.failed = e
+                self.__on_failed()
+                raise
+            await self.__on_stored(seq, blocks)
+
+    def close(self) -> None:
+        """Stops waiting to store the buffered blocks, which are dropped if not stored later."""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    async def __flush_later(self) -> None:
+        """Stores the buffered blocks at the end of the window."""
+        await asyncio.sleep(Config.INGEST_WINDOW)
+        # from here on, the flush must not be cancelled by the next one
+        self.__timer = None
+        try:
+            await self.flush()
+        except Exception:
+            # already reported, and the stream closed
+            pass
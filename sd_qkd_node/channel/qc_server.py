@@ -2,26 +2,31 @@
 import asyncio
 import logging
 import struct
-from socketserver import TCPServer, StreamRequestHandler, ThreadingMixIn
-from struct import unpack
-from threading import Thread
+from asyncio import StreamReader, StreamWriter, IncompleteReadError
 from typing import Final, Any
+from uuid import UUID
 
-from jsons import loads
+from fastapi import HTTPException
 
 from sd_qkd_node.configs import Config
 from qcs import Block
-from sd_qkd_node.database.dbms import dbms_save_link, create_from_qcs_block
+from qcs.protocol import MAGIC, HELLO, HELLO_REPLY, FRAME_HEADER, LEGACY_HEADER, CONTROL, ACK, PAUSE, RESUME, JSON, \
+    BINARY, decode_block
+from sd_qkd_node.channel.ingest import BlockBatch
+from sd_qkd_node.database.dbms import dbms_save_link, create_from_qcs_block, dbms_get_available_material
 
-from sd_qkd_node.external_api import sdnc_api_new_link, sdnc_api_update_link
+from sd_qkd_node.external_api import sdnc_api_new_link
 from sd_qkd_node.info.link_info import update_rate
 
 
 class QCServer:
     """The server listening to new blocks from the quantum channel.
 
+    It runs in the event loop of the app, so that the blocks are stored with the same
+    database connections, without a thread or an event loop for each connection.
+
     Usage:
-    with QCServer():
+    async with QCServer():
         *do things*
 
     Otherwise, you can start it with .start(),
@@ -32,83 +37,197 @@ class QCServer:
         """Initialize the server."""
         self.host = host
         self.port = port
-        self.server = ThreadedTCPServer((host, port), ThreadedTCPRequestHandler)
-
-        def start_server() -> None:
-            self.server.serve_forever(poll_interval=Config.POLL_INTERVAL)
+        self.server: asyncio.Server | None = None
+        self.__handlers: set[asyncio.Task[None]] = set()
 
-        self.server_thread = Thread(
-            target=start_server,
-            daemon=True,
-        )
+    async def __aenter__(self) -> None:
+        """Start the server."""
+        await self.start()
 
-    def __enter__(self) -> None:
-        """Start the simulator."""
-        self.start()
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Stop the server."""
+        await self.stop()
 
-    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
-        """Stop the simulator."""
-        self.stop()
+    async def start(self) -> None:
+        """Start listening to the quantum channel.
 
-    def start(self) -> None:
-        """Start the QC Simulator.
-
-        If you start the QCS calling .start() directly, then you must
+        If you start the server calling .start() directly, then you must
         explicitly stop it with a call to .stop(). For this reason, usage with
-        the 'with' statement should be preferred.
+        the 'async with' statement should be preferred.
         """
-        self.server_thread.start()
+        self.server = await asyncio.start_server(self.__handle, self.host, self.port, reuse_address=True)
 
-    def stop(self) -> None:
-        """Stop the QC Simulator.
+    async def stop(self) -> None:
+        """Stop listening to the quantum channel, closing the open streams.
 
-        If you stop the QCS calling .stop() directly, before you must
+        If you stop the server calling .stop() directly, before you must
         have explicitly started it with a call to .start(). For this reason,
-        usage with the 'with' statement should be preferred.
+        usage with the 'async with' statement should be preferred.
         """
-        self.server.shutdown()
-        self.server.server_close()
-        self.server_thread.join()
-
+        if self.server is None:
+            return
+        self.server.close()
+        # streams are long-lived, the server must not wait for them to be closed by the QCS
+        for handler in self.__handlers:
+            handler.cancel()
+        await asyncio.gather(*self.__handlers, return_exceptions=True)
+        await self.server.wait_closed()
+        self.server = None
+
+    async def __handle(self, reader: StreamReader, writer: StreamWriter) -> None:
+        """Handle a connection from the quantum channel."""
+        handler = asyncio.current_task()
+        self.__handlers.add(handler)
+        try:
+            await handle(reader, writer)
+        except asyncio.CancelledError:
+            # the server is stopping
+            pass
+        finally:
+            self.__handlers.discard(handler)
+            writer.close()
 
-class ThreadedTCPServer(ThreadingMixIn, TCPServer):
-    """Provide thread anc TCP functionalities to the QCServer."""
 
-    allow_reuse_address = True
+# Sequence number of the last block stored for each link, to resume the streams of the QCSs.
+last_received: dict[UUID, int] = {}
 
 
-class ThreadedTCPRequestHandler(StreamRequestHandler):
-    """Class for handling TCP requests."""
+async def handle(reader: StreamReader, writer: StreamWriter) -> None:
+    """Handle a connection from the quantum channel.
 
-    def handle(self) -> None:
-        """Handle a TCP request."""
+    A connection is either a long-lived stream of blocks or, for older QCSs, a single block
+    (see qcs.protocol). A stream is paused while the unconsumed material of its link is
+    over Config.HIGH_WATERMARK, until it goes back under Config.LOW_WATERMARK.
+    """
+    try:
+        head: Final[bytes] = await reader.readexactly(LEGACY_HEADER.size)
+        if head == MAGIC:
+            await __handle_stream(reader, writer)
+        else:
+            await __handle_legacy(reader, head)
+    except (IncompleteReadError, ConnectionError, struct.error):
+        # When the qc is terminated by the simulator, the package sent can be corrupted
+        # Only for testing purposes
+        return
+    except Exception as e:
+        # e.g. a database error storing the blocks: the connection is closed, and the qc sends
+        # again the blocks not acknowledged when it re-opens it
+        logging.getLogger().error(f"Connection from the quantum channel closed: {e!r}")
+
+
+async def __handle_stream(reader: StreamReader, writer: StreamWriter) -> None:
+    """Receives the blocks of a stream, acknowledging them once stored in batches.
+
+    If the stream drops in the middle of a block, or before a batch is stored, the blocks
+    are re-sent when the stream is resumed.
+    """
+    _, link_bytes, requested = HELLO.unpack(MAGIC + await reader.readexactly(HELLO.size - len(MAGIC)))
+    link_id: Final[UUID] = UUID(bytes=link_bytes)
+    fmt: Final[int] = accepted_format(requested)
+    last = last_received.get(link_id, 0)
+    writer.write(HELLO_REPLY.pack(last, fmt))
+    await __throttle(writer, link_id, last)
+
+    async def stored(stored_seq: int, blocks: list[Block]) -> None:
+        last_received[link_id] = stored_seq
         try:
-            len_data: Final[int] = unpack(">I", self.rfile.read(4))[0]
-        except struct.error:
-            # When the qc is terminated by the simulator, the package sent can be corrupted
-            # Only for testing purposes
+            writer.write(CONTROL.pack(ACK, stored_seq))
+            await writer.drain()
+            await report_blocks(blocks)
+            await __throttle(writer, link_id, stored_seq)
+        except (ConnectionError, OSError):
             return
-        data: Final[str] = self.rfile.read(len_data).decode()
 
-        new_block: Block = loads(data, Block, strict=True)
+    batch = BlockBatch(on_stored=stored, on_failed=writer.close)
+    try:
+        while header := await reader.read(FRAME_HEADER.size):
+            if len(header) < FRAME_HEADER.size:
+                header += await reader.readexactly(FRAME_HEADER.size - len(header))
+            len_data, seq = FRAME_HEADER.unpack(header)
+            data: bytes = await reader.readexactly(len_data)
+            # blocks re-sent when the stream is resumed could have been already received
+            if seq > max(last_received.get(link_id, 0), batch.last_seq):
+                await batch.add(seq, decode(data, fmt))
+        await batch.flush()
+    finally:
+        batch.close()
+
+
+async def __throttle(writer: StreamWriter, link_id: UUID, seq: int) -> None:
+    """Pauses the stream of the link while its unconsumed material is over the watermarks.
+
+    'seq' is the sequence number of the last block stored for the link.
+    """
+    if not Config.HIGH_WATERMARK:
+        return
+    available = await dbms_get_available_material(link_id)
+    if available <= Config.HIGH_WATERMARK:
+        return
+    logging.getLogger().info(f"Link {link_id} paused, {available} B unconsumed")
+    writer.write(CONTROL.pack(PAUSE, seq))
+    while available >= Config.LOW_WATERMARK:
+        await asyncio.sleep(Config.PAUSE_CHECK_INTERVAL)
+        available = await dbms_get_available_material(link_id)
+    logging.getLogger().info(f"Link {link_id} resumed, {available} B unconsumed")
+    writer.write(CONTROL.pack(RESUME, seq))
+
+
+async def __handle_legacy(reader: StreamReader, head: bytes) -> None:
+    """Receives the blocks sent one by one in JSON, without acknowledgements."""
+    if not Config.COMPATIBILITY_MODE:
+        logging.getLogger().error("Blocks in JSON from the quantum channel are accepted only in COMPATIBILITY_MODE")
+        return
+    while head:
+        len_data: int = LEGACY_HEADER.unpack(head)[0]
+        await add_block(decode(await reader.readexactly(len_data), JSON))
+        head = await reader.read(LEGACY_HEADER.size)
+
+
+def accepted_format(requested: int) -> int:
+    """The format of the blocks accepted from a QCS that requested the given one.
+
+    JSON is accepted only in COMPATIBILITY_MODE, BINARY otherwise.
+    """
+    if requested == JSON and Config.COMPATIBILITY_MODE:
+        return JSON
+    return BINARY
 
-        if Config.COMPATIBILITY_MODE and new_block.link_id is None:
-            from uuid import uuid4
 
-            new_block = Block(
-                time=new_block.time, id=new_block.id, key=new_block.key, link_id=uuid4()
-            )
+def decode(data: bytes, fmt: int) -> Block:
+    """Decode a block received from the quantum channel."""
+    new_block: Block = decode_block(data, fmt)
 
-        asyncio.run(add_block(new_block))
+    if Config.COMPATIBILITY_MODE and new_block.link_id is None:
+        from uuid import uuid4
+
+        new_block = Block(
+            time=new_block.time, id=new_block.id, key=new_block.key, link_id=uuid4()
+        )
+    return new_block
 
 
 async def add_block(new_block: Block) -> None:
     """Add newly-generated block to database."""
     await create_from_qcs_block(new_block)
+    await report_blocks([new_block])
+
+
+async def report_blocks(blocks: list[Block]) -> None:
+    """Accounts the blocks, already stored, in the rate of their link.
+
+    The SDN Controller is notified right away of a new link, while the rates of the known
+    ones are reported periodically by the RateReporter.
+    """
     ttl = 15
-    link, update = update_rate(new_block.link_id, len(new_block.key))
-    if not update:
-        new = await dbms_save_link(link_id=new_block.link_id, rate=link.rate, ttl=ttl)
-        await sdnc_api_new_link(new_block.link_id, link.rate, ttl)
-    else:
-        await sdnc_api_update_link(link_id=new_block.link_id, rate=link.rate)
+    link_id = blocks[0].link_id
+    created = False
+    for b in blocks:
+        link, update = update_rate(link_id, len(b.key))
+        created = created or not update
+    if not created:
+        return
+    try:
+        await dbms_save_link(link_id=link_id, rate=link.rate, ttl=ttl)
+        await sdnc_api_new_link(link_id, link.rate, ttl)
+    except HTTPException as e:
+        logging.getLogger().error(f"Link {link_id} not reported: {e.detail}")
@@ -23,8 +23,27 @@ class Base(ABC):
         self.QC_TO_KME_PORT = int(qc_port)
         self.KME_BASE_URL = config["SHARED"]["KME_BASE_URL"]
         self.AGENT_BASE_URL = config["SHARED"]["AGENT_BASE_URL"]
-        self.COMPATIBILITY_MODE = config["SHARED"]["COMPATIBILITY_MODE"]
+        self.COMPATIBILITY_MODE = config["SHARED"].getboolean("COMPATIBILITY_MODE")
         self.TTL = int(config["SHARED"]["TTL"])
+        self.HIGH_WATERMARK = int(config["SHARED"]["HIGH_WATERMARK"])
+        self.LOW_WATERMARK = int(config["SHARED"]["LOW_WATERMARK"])
+        self.PAUSE_CHECK_INTERVAL = float(config["SHARED"]["PAUSE_CHECK_INTERVAL"])
+        self.INGEST_BATCH_SIZE = int(config["SHARED"]["INGEST_BATCH_SIZE"])
+        self.INGEST_WINDOW = float(config["SHARED"]["INGEST_WINDOW"])
+        self.RATE_REPORT_INTERVAL = float(config["SHARED"]["RATE_REPORT_INTERVAL"])
+        self.POOL_SIZE = int(config["SHARED"]["POOL_SIZE"])
+        self.POOL_SAVE_INTERVAL = float(config["SHARED"]["POOL_SAVE_INTERVAL"])
+        self.REAP_INTERVAL = float(config["SHARED"]["REAP_INTERVAL"])
+        self.REAP_BATCH_SIZE = int(config["SHARED"]["REAP_BATCH_SIZE"])
+        self.BLOCK_USED_BATCH_SIZE = int(config["SHARED"]["BLOCK_USED_BATCH_SIZE"])
+        self.BLOCK_USED_WINDOW = float(config["SHARED"]["BLOCK_USED_WINDOW"])
+        self.SHARED_CURSOR = config["SHARED"].getboolean("SHARED_CURSOR")
+        self.PRESLICE_SIZES = int(config["SHARED"]["PRESLICE_SIZES"])
+        self.PRESLICE_DEPTH = int(config["SHARED"]["PRESLICE_DEPTH"])
+        self.PRESLICE_INTERVAL = float(config["SHARED"]["PRESLICE_INTERVAL"])
+        self.PRESLICE_MAX_AGE = int(config["SHARED"]["PRESLICE_MAX_AGE"])
+        self.PRESLICE_SURPLUS = int(config["SHARED"]["PRESLICE_SURPLUS"])
+        self.PRESLICE_MAX_BYTES = int(config["SHARED"]["PRESLICE_MAX_BYTES"])
         self.MIN_KEY_SIZE = int(config["SHARED"]["MIN_KEY_SIZE"])
         self.MAX_KEY_SIZE = int(config["SHARED"]["MAX_KEY_SIZE"])
         self.DEFAULT_KEY_SIZE = int(config["SHARED"]["DEFAULT_KEY_SIZE"])
@@ -37,7 +56,8 @@ class Base(ABC):
         self.SDN_CONTROLLER_ADDRESS = f"http://{self.SDN_CONTROLLER_IP}:{self.SDN_CONTROLLER_PORT}"
         self.SUPPORTED_EXTENSION_PARAMS: frozenset[str] = frozenset()
         self.LOCAL_DB_URL = f"sqlite:///{self.KME_IP}_{self.SAE_TO_KME_PORT}_local_db"
-        self.KEYS_AHEAD = int(config["SHARED"]["KEYS_AHEAD"])
+        self.QKP_LOW_WATERMARK = int(config["SHARED"]["QKP_LOW_WATERMARK"])
+        self.QKP_HIGH_WATERMARK = int(config["SHARED"]["QKP_HIGH_WATERMARK"])
 
     @property
     @abstractmethod
@@ -54,11 +74,6 @@ class Base(ABC):
     def SHARED_DB_URL(self) -> str:
         """URL for shared database connection."""
 
-    @property
-    @abstractmethod
-    def POLL_INTERVAL(self) -> float:
-        """The qcserver polls for shutdown every POLL_INTERVAL seconds."""
-
 
 @dataclass(frozen=False, slots=True, init=False)
 class Prod(Base):
@@ -66,7 +81,6 @@ class Prod(Base):
 
     DEBUG = False
     TESTING = False
-    POLL_INTERVAL = 0.5
 
     @property
     def SHARED_DB_URL(self) -> str:
@@ -95,7 +109,6 @@ class Dev(Base):
     DEBUG = True
     TESTING = False
     SHARED_DB_URL = "sqlite:///devdb"
-    POLL_INTERVAL = 0.001
 
 
 @dataclass(frozen=False, slots=True, init=False)
@@ -105,4 +118,3 @@ class Test(Base):
     DEBUG = False
     TESTING = True
     SHARED_DB_URL = "sqlite:///testdb"
-    POLL_INTERVAL = 0.001
@@ -0,0 +1,96 @@
+"""Batched notifications to the companion KMEs of the bytes used in the blocks."""
+import asyncio
+import logging
+from asyncio import Task
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException
+
+from sd_qkd_node.configs import Config
+from sd_qkd_node.external_api import kme_api_block_used
+from sd_qkd_node.model.block_used import BlockUsed, BlockUsedRequest
+
+
+class BlockUsedQueue:
+    """The updates to the blocks of a companion KME, sent in order with batched block_used calls.
+
+    The updates are queued without waiting, and sent when they reach Config.BLOCK_USED_BATCH_SIZE,
+    or Config.BLOCK_USED_WINDOW seconds after the first one was queued. Each update has a sequence
+    number in the 'stream' of the queue: a batch is sent only after the previous one, and sent
+    again after a failure, while the companion applies each update of the stream only once.
+    """
+
+    def __init__(self, addr: str) -> None:
+        self.addr = addr
+        self.stream = uuid4()
+        self.__seq = 0
+        self.__updates: list[BlockUsed] = []
+        self.__lock = asyncio.Lock()
+        self.__timer: Task[None] | None = None
+        self.__sending: set[Task[None]] = set()
+
+    def __len__(self) -> int:
+        return len(self.__updates)
+
+    def add(self, block_id: UUID, end: int, in_use: int = 1) -> None:
+        """Queues an update, sending the batch in background if full."""
+        self.__seq += 1
+        self.__updates.append(BlockUsed(seq=self.__seq, block_id=block_id, end=end, in_use=in_use))
+        if len(self.__updates) >= Config.BLOCK_USED_BATCH_SIZE:
+            self.__cancel_timer()
+            task = asyncio.create_task(self.flush())
+            self.__sending.add(task)
+            task.add_done_callback(self.__sending.discard)
+        elif self.__timer is None:
+            self.__timer = asyncio.create_task(self.__flush_later())
+
+    async def flush(self) -> None:
+        """Sends the queued updates, if any, keeping them queued if the companion is not reachable."""
+        async with self.__lock:
+            updates, self.__updates = self.__updates, []
+            if not updates:
+                return
+            try:
+                await kme_api_block_used(self.addr, BlockUsedRequest(stream=self.stream, updates=updates))
+            except Exception as e:
+                # kept on any failure, e.g. an httpx error other than a failed connection, or the stream drifts
+                detail = e.detail if isinstance(e, HTTPException) else repr(e)
+                logging.getLogger().error(f"{len(updates)} block updates not sent to {self.addr}: {detail}")
+                self.__updates[:0] = updates
+                if self.__timer is None:
+                    self.__timer = asyncio.create_task(self.__flush_later())
+
+    async def close(self) -> None:
+        """Sends the queued updates, waiting for the batches being sent."""
+        self.__cancel_timer()
+        await asyncio.gather(*self.__sending, return_exceptions=True)
+        await self.flush()
+
+    def __cancel_timer(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    async def __flush_later(self) -> None:
+        """Sends the queued updates at the end of the window."""
+        await asyncio.sleep(Config.BLOCK_USED_WINDOW)
+        # from here on, the flush must not be cancelled by the next one
+        self.__timer = None
+        await self.flush()
+
+
+queues: dict[str, BlockUsedQueue] = {}
+
+
+def notify_block_used(addr: str, block_id: UUID, end: int, in_use: int = 1) -> None:
+    """Queues the update of a block for the companion KME at 'addr', used up to 'end' by 'in_use' more keys."""
+    try:
+        queue = queues[addr]
+    except KeyError:
+        queue = queues[addr] = BlockUsedQueue(addr)
+    queue.add(block_id, end, in_use)
+
+
+async def close_queues() -> None:
+    """Sends the updates still queued for all the companion KMEs."""
+    await asyncio.gather(*(q.close() for q in queues.values()))
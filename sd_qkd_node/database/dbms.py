@@ -2,38 +2,74 @@
 import asyncio
 import logging
 
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable
 from dataclasses import dataclass
 from typing import Final
 from uuid import UUID, uuid4
 
 from fastapi import HTTPException
 from orm import NoMatch
+from sqlalchemy import case, func, select
 
 from sd_qkd_node.configs import Config
-from sd_qkd_node.database import orm, shared_db
-from sd_qkd_node.encoder import dump, load
-from sd_qkd_node.external_api import kme_update_block
-from sd_qkd_node.model import Key
+from sd_qkd_node.database import orm, shared_db, local_db
+from sd_qkd_node.database.block_notifier import notify_block_used
+from sd_qkd_node.database.instructions import Instruction, decode_instructions, encode_instructions
+from sd_qkd_node.database.pool import KeyPool, PoolBlock, get_pool, pools
+from sd_qkd_node.model import RawKey
+from sd_qkd_node.model.block_used import BlockUsedRequest
 from sd_qkd_node.model.errors import BlockNotFound
-from sd_qkd_node.model.key_container import KeyContainer
-from sd_qkd_node.utils import bit_length, collectionint_to_b64, now
-
-lock_links = asyncio.Lock()
-lock_blocks = asyncio.Lock()
-lock = asyncio.Lock()
+from sd_qkd_node.utils import now
+
+# The generation of keys is serialized on each link, the links are independent of each other.
+link_locks: defaultdict[UUID, asyncio.Lock] = defaultdict(asyncio.Lock)
+# The relays of each ksid are serialized, since the KMEs along the chain look up its keys by ksid.
+relay_locks: defaultdict[UUID, asyncio.Lock] = defaultdict(asyncio.Lock)
+# The links by companion KME, read without querying the database. Updated with the links.
+links_by_companion: dict[UUID, orm.Link] = {}
+# The sequence number of the last update applied, for each stream of block_used updates.
+applied_block_used: dict[UUID, int] = {}
+# Direct keys cut in advance, by link and size in bits, in the order they were cut.
+presliced: defaultdict[UUID, dict[int, deque["PreslicedKey"]]] = defaultdict(dict)
+# The sizes of the direct keys requested on each link, with the number of requests, and the links themselves.
+requested_sizes: defaultdict[UUID, Counter[int]] = defaultdict(Counter)
+requested_links: dict[UUID, orm.Link] = {}
+# When the counts of the sizes requested on each link were last halved.
+requested_decayed: dict[UUID, int] = {}
+
+# Blocks of the pools written with a single statement, within the limit of parameters of SQLite.
+SAVE_CHUNK: Final[int] = 150
 
 
 # OK
-async def __clear() -> None:
-    """Deletes unnecessary blocks from database.
+async def dbms_reap_blocks(batch_size: int) -> tuple[int, int]:
+    """Deletes unnecessary blocks from database, 'batch_size' at a time.
 
-    A block is deleted if it satisfies at least one of the following conditions:
+    A block is deleted if it is not in use and it satisfies at least one of the following conditions:
     - It reached Config.TTL, that is: it is considered too old in order to be used for key generation.
     - Its number of available bits is 0: the block has been completely exploited for key generation.
+
+    The state of the blocks in the pools is saved first, and the reclaimable blocks at their head
+    are dropped. Returns the number of blocks deleted and of their bytes.
     """
-    logging.getLogger().info("INFO clearing local db from old blocks")
-    await orm.Block.objects.filter(available_bits__exact=0, in_use=0).delete()
-    await orm.Block.objects.filter(timestamp__lte=now() - Config.TTL, in_use=0).delete()
+    for pool in pools.values():
+        pool.reap()
+    await dbms_save_pools()
+    table = orm.Block.objects.table
+    reclaimable = (table.c.in_use == 0) & ((table.c.available_bits == 0) | (table.c.timestamp <= now() - Config.TTL))
+    blocks, size = 0, 0
+    while True:
+        rows = await local_db.fetch_all(
+            select(table.c.id, func.length(table.c.material)).where(reclaimable).limit(batch_size)
+        )
+        if not rows:
+            return blocks, size
+        await local_db.execute(table.delete().where(table.c.id.in_([r[0] for r in rows])))
+        blocks += len(rows)
+        size += sum(r[1] for r in rows)
+        if len(rows) < batch_size:
+            return blocks, size
 
 
 # ---------------- NEW GET KEY-------------------
@@ -63,29 +99,25 @@ async def __get_key_on_db(key_id: UUID | None, ksid: UUID | None, link_id: UUID
 
 
 # OK
-async def __retrieve_key_direct(key_id: UUID) -> Key:
-    orm_key: orm.Key = await __get_key_on_db(key_id=key_id, ksid=None, link_id=None)
-    if orm_key is not None:
-        logging.getLogger().info(f"deleting key ...{str(key_id)[25:]} [__retrieve_key_direct]")
-        await orm_key.delete()
-        logging.getLogger().info(f"deleted key ...{str(key_id)[25:]} [__retrieve_key_direct]")
-        try:
-            key_material = await __retrieve_key_material(json_instructions=orm_key.instructions)
-        except BlockNotFound:
-            raise BlockNotFound()
-        return Key(key_id, key_material)
-    else:
+async def __retrieve_keys_direct(key_ids: list[UUID]) -> list[RawKey]:
+    """Gets the keys with the given ids, deleting them from the shared db with a single statement."""
+    table = orm.Key.objects.table
+    rows = {r["key_id"]: r for r in await shared_db.fetch_all(table.select().where(table.c.key_id.in_(key_ids)))}
+    if missing := [k for k in key_ids if k not in rows]:
         raise HTTPException(
             status_code=500,
-            detail=f"Direct key not found ...{str(key_id)[25:]}"
+            detail=f"Key not found on db ...{str(missing[0])[25:]}"
         )
+    logging.getLogger().info(f"deleting {len(key_ids)} keys [__retrieve_keys_direct]")
+    await shared_db.execute(table.delete().where(table.c.key_id.in_(key_ids)))
+    materials = await __retrieve_keys_material([rows[k]["instructions"] for k in key_ids])
+    return [RawKey(key_id, key_material) for key_id, key_material in zip(key_ids, materials)]
 
 
 # OK
-async def dbms_get_key_direct(key_id: UUID) -> KeyContainer:
-    await __clear()
+async def dbms_get_keys_direct(key_ids: list[UUID]) -> list[RawKey]:
     try:
-        return KeyContainer(keys=tuple([await __retrieve_key_direct(key_id=key_id)]))
+        return await __retrieve_keys_direct(key_ids=key_ids)
     except BlockNotFound:
         raise HTTPException(
             status_code=500,
@@ -95,28 +127,32 @@ async def dbms_get_key_direct(key_id: UUID) -> KeyContainer:
 
 # OK
 async def __get_link_by_companion(companion: UUID) -> orm.Link:
+    try:
+        return links_by_companion[companion]
+    except KeyError:
+        pass
     logging.getLogger().info("INFO getting link by companion")
-    async with lock_links:
-        try:
-            link = await orm.Link.objects.get(companion=companion)
-            return link
-        except NoMatch:
-            raise HTTPException(
-                status_code=500,
-                detail=f"on {Config.SAE_TO_KME_PORT} Link with KME companion ...{str(companion)[25:]} not found"
-            )
+    try:
+        link = await orm.Link.objects.get(companion=companion)
+    except NoMatch:
+        raise HTTPException(
+            status_code=500,
+            detail=f"on {Config.SAE_TO_KME_PORT} Link with KME companion ...{str(companion)[25:]} not found"
+        )
+    links_by_companion[companion] = link
+    return link
 
 
 # OK
-async def dbms_get_decryption_key(ksid: orm.Ksid) -> Key:
+async def dbms_get_decryption_key(ksid: orm.Ksid) -> RawKey:
     link: orm.Link = await __get_link_by_companion(companion=ksid.kme_src)
     orm_key: orm.Key = await __get_key_on_db(ksid=ksid.ksid, link_id=link.link_id, key_id=None)
     if orm_key is not None:
         logging.getLogger().info(f"deleting key on db for ksid ...{str(ksid.ksid)[25:]} [dbms_get_decryption_key]")
         await orm_key.delete()
         logging.getLogger().info(f"deleted key on db for ksid ...{str(ksid.ksid)[25:]} [dbms_get_decryption_key]")
-        key_material = await __retrieve_key_material(json_instructions=orm_key.instructions)
-        return Key(orm_key.key_id, key_material)
+        key_material = await __retrieve_key_material(encoded_instructions=orm_key.instructions)
+        return RawKey(orm_key.key_id, key_material)
     else:
         raise HTTPException(
             status_code=500,
@@ -125,33 +161,33 @@ async def dbms_get_decryption_key(ksid: orm.Ksid) -> Key:
 
 
 # OK
-async def __retrieve_key_relay(key_id: UUID) -> Key:
-    """Gets key material for relay connection."""
-    key: orm.LocalKey = await orm.LocalKey.objects.filter(key_id=key_id).first()
-    if key is None:
+async def dbms_get_relayed_keys(key_ids: list[UUID]) -> list[RawKey]:
+    """Gets the relayed keys with the given ids, deleting them with a single statement."""
+    table = orm.LocalKey.objects.table
+    rows = {r["key_id"]: r for r in await local_db.fetch_all(table.select().where(table.c.key_id.in_(key_ids)))}
+    if missing := [k for k in key_ids if k not in rows]:
         raise HTTPException(
             status_code=500,
-            detail=f"Relay key not found ...{str(key_id)[25:]}"
+            detail=f"Relay key not found ...{str(missing[0])[25:]}"
         )
-    else:
-        await key.delete()
-        return Key(key_ID=key_id, key=key.key)
+    await local_db.execute(table.delete().where(table.c.key_id.in_(key_ids)))
+    return [RawKey(key_ID=k, key=rows[k]["key"]) for k in key_ids]
 
 
-# OK
-async def dbms_get_relayed_key(key_id: UUID) -> KeyContainer:
-    await __clear()
-    return KeyContainer(keys=tuple([await __retrieve_key_relay(key_id=key_id)]))
+async def dbms_count_local_keys(ksid: UUID) -> int:
+    """The number of keys of the ksid generated ahead and stored locally."""
+    table = orm.LocalKey.objects.table
+    return await local_db.fetch_val(select(func.count()).select_from(table).where(table.c.ksid == ksid))
 
 
 # OK
-async def get_local_key(ksid: UUID) -> Key | None:
+async def get_local_key(ksid: UUID) -> RawKey | None:
     # not relevant which one is returned first
     key: orm.LocalKey = await orm.LocalKey.objects.filter(ksid=ksid).first()
     if key is not None:
         logging.getLogger().info(f"GOT LOCAL KEY {key.key}")
         await key.delete()
-        return Key(key_ID=key.key_id, key=key.key)
+        return RawKey(key_ID=key.key_id, key=key.key)
     else:
         return None
 
@@ -160,31 +196,174 @@ async def get_local_key(ksid: UUID) -> Key | None:
 
 # ---------------- NEW KEY GENERATION ----------------
 
-# OK
-async def __generate_single_key_direct(size: int, link: orm.Link, ksid: UUID, local: bool) -> Key:
-    key_id: UUID = uuid4()
-    key_material, json_instructions = await __generate_key_material(req_bitlength=size, link=link, use=True)
-    logging.getLogger().info(f"creating key on db for ksid ...{str(ksid)[25:]} [__generate_single_key_direct]")
-    await orm.Key.objects.create(key_id=key_id, ksid=ksid, instructions=json_instructions, relay=False)
-    logging.getLogger().info(f"created key on db for ksid ...{str(ksid)[25:]} [__generate_single_key_direct]")
-    if local:
-        # Store also locally since it is a future key, to be returned without retrieving instructions
-        await orm.LocalKey.objects.create(key_id=key_id, ksid=ksid, key=key_material, relay=False)
-    return Key(key_ID=key_id, key=key_material)
+async def __generate_keys_direct(
+        size: int, link: orm.Link, ksid: UUID, number: int, ahead: int = 0
+) -> list[RawKey]:
+    """Generates 'ahead' future keys and 'number' keys, stored on the shared db with a single insert.
+
+    The future keys are stored also locally, with a single insert, and only the 'number' keys
+    are returned.
+    """
+    keys: list[RawKey] = []
+    rows: list[dict[str, object]] = []
+    for key_material, encoded_instructions in await __next_keys_material(size=size, link=link, number=ahead + number):
+        key_id: UUID = uuid4()
+        rows.append({"key_id": key_id, "ksid": ksid, "instructions": encoded_instructions, "relay": False})
+        keys.append(RawKey(key_ID=key_id, key=key_material))
+    logging.getLogger().info(f"creating {len(rows)} keys on db for ksid ...{str(ksid)[25:]} [__generate_keys_direct]")
+    await shared_db.execute(orm.Key.objects.table.insert().values(rows))
+    if ahead > 0:
+        # Store also locally since they are future keys, to be returned without retrieving instructions
+        await __save_local_keys(keys=keys[:ahead], ksid=ksid)
+    return keys[ahead:]
+
+
+async def __save_local_keys(keys: list[RawKey], ksid: UUID) -> None:
+    """Stores the keys locally, with a single insert."""
+    await local_db.execute(orm.LocalKey.objects.table.insert().values([
+        {"key_id": k.key_ID, "ksid": ksid, "key": k.key, "relay": False} for k in keys
+    ]))
+
+
+@dataclass(frozen=True, slots=True)
+class PreslicedKey:
+    """A direct key cut in advance: its material and instructions, and the timestamp of its oldest block."""
+
+    material: bytes
+    instructions: bytes
+    oldest: int
+
+    @property
+    def stale(self) -> bool:
+        """True if its oldest block is too close to expire, for the companion KME to retrieve the key."""
+        return self.oldest <= now() - Config.PRESLICE_MAX_AGE
+
+
+async def __next_keys_material(size: int, link: orm.Link, number: int) -> list[tuple[bytes, bytes]]:
+    """The material and the instructions of 'number' direct keys of 'size' bits.
+
+    The keys cut in advance are used first, unless stale, the others are taken from the pool together.
+    """
+    requested_sizes[link.link_id][size] += number
+    requested_links[link.link_id] = link
+    queue = presliced[link.link_id].get(size, deque())
+    keys: list[tuple[bytes, bytes]] = []
+    stale: list[PreslicedKey] = []
+    while queue and len(keys) < number:
+        key = queue.popleft()
+        if key.stale:
+            stale.append(key)
+        else:
+            keys.append((key.material, key.instructions))
+    await __release_presliced(link=link, keys=stale)
+    if len(keys) < number:
+        keys.extend(await __generate_keys_material(req_bitlength=size, link=link, use=True, number=number - len(keys)))
+    return keys
+
+
+async def dbms_preslice_keys(depth: int, sizes: int, surplus: int, max_bytes: int) -> int:
+    """Cuts direct keys in advance, up to 'depth' for each of the 'sizes' sizes most requested on each link.
+
+    Keys are cut only from the bytes available in the pool of the link beyond 'surplus', and up to
+    'max_bytes' held by the keys cut in advance on the link, so the material is not locked in keys
+    that may never be requested. The keys are cut like on request, so the companion KME is notified
+    of the bytes used right away. The keys stale, or of sizes no longer among the most requested,
+    are given back. The counts of the sizes requested are halved every Config.PRESLICE_MAX_AGE
+    seconds, and the links without requests left are forgotten. Returns the number of keys cut.
+    """
+    cut = 0
+    for link_id in list(requested_sizes):
+        link = requested_links[link_id]
+        if requested_decayed.setdefault(link_id, now()) <= now() - Config.PRESLICE_MAX_AGE:
+            requested_decayed[link_id] = now()
+            requested_sizes[link_id] = Counter({s: n // 2 for s, n in requested_sizes[link_id].items() if n > 1})
+        most_requested = [size for size, _ in requested_sizes[link_id].most_common(sizes)]
+        queues = presliced[link_id]
+        for size in [s for s in queues if s not in most_requested]:
+            await __release_presliced(link=link, keys=queues.pop(size))
+        for size in most_requested:
+            queue = queues.setdefault(size, deque())
+            stale: list[PreslicedKey] = []
+            while queue and queue[0].stale:
+                stale.append(queue.popleft())
+            await __release_presliced(link=link, keys=stale)
+        spare = get_pool(link_id).available() - surplus
+        held = sum(len(k.material) for queue in queues.values() for k in queue)
+        for size in most_requested:
+            queue = queues[size]
+            while len(queue) < depth and size // 8 <= min(spare, max_bytes - held):
+                async with link_locks[link_id]:
+                    try:
+                        key = __presliced_key(*await __generate_key_material(req_bitlength=size, link=link, use=True))
+                    except BlockNotFound:
+                        break
+                spare -= len(key.material)
+                if key.stale:
+                    # cut from blocks about to expire, tried again at the next round
+                    await __release_presliced(link=link, keys=[key])
+                    break
+                queue.append(key)
+                held += len(key.material)
+                cut += 1
+        if not requested_sizes[link_id]:
+            del requested_sizes[link_id], requested_links[link_id], requested_decayed[link_id]
+            presliced.pop(link_id, None)
+    return cut
+
+
+async def dbms_release_presliced() -> None:
+    """Gives back the blocks of all the keys cut in advance, e.g. when the KME stops."""
+    for link_id, queues in list(presliced.items()):
+        del presliced[link_id]
+        for queue in queues.values():
+            await __release_presliced(link=requested_links[link_id], keys=queue)
+
+
+def __presliced_key(material: bytes, encoded_instructions: bytes) -> PreslicedKey:
+    """A key just cut in advance, with the timestamp of its oldest block, still in the pool."""
+    blocks = [__find_in_pools(i.block_id)[0] for i in decode_instructions(encoded_instructions)]
+    oldest = min((b.timestamp for b in blocks if b is not None), default=now())
+    return PreslicedKey(material, encoded_instructions, oldest)
+
+
+async def __release_presliced(link: orm.Link, keys: Iterable[PreslicedKey]) -> None:
+    """Gives back the blocks of keys cut in advance and never used, decrementing their 'in_use' on both ends.
+
+    The companion KME is notified as for the bytes used, unless in Config.SHARED_CURSOR mode.
+    The blocks not in the pools are updated with a single statement.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    companion_kme_addr: str | None = None
+    if not Config.SHARED_CURSOR:
+        companion_kme_addr = await dbms_get_kme_address(dst=link.companion)
+    on_db: Counter[UUID] = Counter()
+    for i in (i for k in keys for i in decode_instructions(k.instructions)):
+        pool_block, pool = __find_in_pools(i.block_id)
+        if pool_block is not None:
+            pool.update(pool_block, in_use=-1)
+        else:
+            on_db[i.block_id] += 1
+        if companion_kme_addr is not None:
+            notify_block_used(addr=companion_kme_addr, block_id=i.block_id, end=i.end, in_use=-1)
+    if on_db:
+        table = orm.Block.objects.table
+        await local_db.execute(table.update().where(table.c.block_id.in_(list(on_db))).values(
+            in_use=table.c.in_use - case(*[(table.c.block_id == block_id, n) for block_id, n in on_db.items()])
+        ))
+    logging.getLogger().info(f"Gave back {len(keys)} keys cut in advance on link ...{str(link.link_id)[25:]}")
 
 
 # OK
-async def dbms_generate_keys_direct(ksid: orm.Ksid, size: int, local: bool) -> Key:
+async def dbms_generate_keys_direct(ksid: orm.Ksid, size: int, number: int = 1, ahead: int = 0) -> list[RawKey]:
     link: orm.Link = await __get_link_by_companion(companion=ksid.kme_dst)
     transaction = await shared_db.transaction()
-    async with lock:
+    async with link_locks[link.link_id]:
         try:
-            if local:
-                for _ in range(Config.KEYS_AHEAD):
-                    # generates future keys storing them both on local db and shared db
-                    await __generate_single_key_direct(size=size, ksid=ksid.ksid, link=link, local=True)
-            # the last key generated is the one returned immediately, thus it is stored only on the shared db
-            key = await __generate_single_key_direct(size=size, ksid=ksid.ksid, link=link, local=False)
+            # generates first the 'ahead' future keys, storing them both on local db and shared db,
+            # while the last keys generated are the ones returned immediately, thus stored only on the shared db
+            keys = await __generate_keys_direct(size=size, ksid=ksid.ksid, link=link, number=number, ahead=ahead)
         except BlockNotFound:
             await transaction.rollback()
             raise HTTPException(
@@ -199,36 +378,22 @@ async def dbms_generate_keys_direct(ksid: orm.Ksid, size: int, local: bool) -> K
             )
         else:
             await transaction.commit()
-            return key
-
-
-# OK
-async def __generate_single_key_relay(size: int, ksid: UUID, link: orm.Link, store: bool) -> Key:
-    key_id: UUID = uuid4()
-    key_material, json_instructions = await __generate_key_material(req_bitlength=size, link=link, use=False)
-    if store:
-        # relayed keys are not shared with any KME directly, thus they are stored only locally
-        # this is even more true if they are future keys
-        await orm.LocalKey.objects.create(key_id=key_id, ksid=ksid, key=key_material, relay=False)
-    return Key(key_ID=key_id, key=key_material)
+            return keys
 
 
 # OK
-async def dbms_generate_keys_relay(ksid: orm.Ksid, size: int, local: bool) -> tuple[Key, list[Key]] | Key:
+async def dbms_generate_keys_relay(ksid: orm.Ksid, size: int, number: int = 1) -> list[RawKey]:
+    """Generates 'number' relayed keys, not stored since they are relayed and returned to the master SAE."""
     link: orm.Link = await __get_link_by_companion(companion=ksid.kme_dst)
-    future_keys: list[Key] = []
     transaction = await shared_db.transaction()
-    async with lock:
+    async with link_locks[link.link_id]:
         try:
-            if local:
-                for _ in range(Config.KEYS_AHEAD):
-                    future_keys.append(
-                        await __generate_single_key_relay(size=size, ksid=ksid.ksid, link=link, store=True)
-                    )
-                    logging.getLogger().info(f"FUTURE KEY {future_keys[-1].key}")
-            # The last generated key is the one immediately returned to the master SAE, thus it is not necessary
-            # to store it locally
-            key = await __generate_single_key_relay(size=size, ksid=ksid.ksid, link=link, store=False)
+            keys = [
+                RawKey(key_ID=uuid4(), key=key_material)
+                for key_material, _ in await __generate_keys_material(
+                    req_bitlength=size, link=link, use=False, number=number
+                )
+            ]
         except BlockNotFound:
             await transaction.rollback()
             raise HTTPException(
@@ -243,22 +408,27 @@ async def dbms_generate_keys_relay(ksid: orm.Ksid, size: int, local: bool) -> tu
             )
         else:
             await transaction.commit()
-            if not local:
-                return key
-            return key, future_keys
+            return keys
+
+
+async def dbms_save_local_keys(ksid: orm.Ksid, keys: list[RawKey]) -> None:
+    """Stores locally the keys of a ksid generated ahead."""
+    # relayed keys are not shared with any KME directly, thus the future ones are stored only locally
+    await __save_local_keys(keys=keys, ksid=ksid.ksid)
+    logging.getLogger().info(f"FUTURE KEYS {[k.key for k in keys]}")
 
 
 # OK
-async def dbms_generate_encryption_key_for_relay(ksid: orm.Ksid, size: int) -> Key:
+async def dbms_generate_encryption_key_for_relay(ksid: orm.Ksid, size: int) -> RawKey:
     link: orm.Link = await __get_link_by_companion(companion=ksid.kme_dst)
     key_id: UUID = uuid4()
     transaction = await shared_db.transaction()
-    async with lock:
+    async with link_locks[link.link_id]:
         try:
-            key_material, json_instructions = await __generate_key_material(req_bitlength=size, link=link, use=True)
+            key_material, encoded_instructions = await __generate_key_material(req_bitlength=size, link=link, use=True)
             logging.getLogger().info(f"creating key on db for ksid ...{str(ksid.ksid)[25:]} [dbms_generate_encryption_key_for_relay]")
             await orm.Key.objects.create(
-                key_id=key_id, ksid=ksid.ksid, instructions=json_instructions, relay=True, link_id=link.link_id
+                key_id=key_id, ksid=ksid.ksid, instructions=encoded_instructions, relay=True, link_id=link.link_id
             )
             logging.getLogger().info(f"created key on db for ksid ...{str(ksid.ksid)[25:]} [dbms_generate_encryption_key_for_relay]")
         except BlockNotFound:
@@ -275,24 +445,27 @@ async def dbms_generate_encryption_key_for_relay(ksid: orm.Ksid, size: int) -> K
             )
         else:
             await transaction.commit()
-            return Key(key_ID=key_id, key=key_material)
+            return RawKey(key_ID=key_id, key=key_material)
             # await orm.Key.objects.filter(ksid=ksid.ksid, link_id=link.link_id).first()
 
 
 # OK
-async def dbms_save_relayed_key(ksid: orm.Ksid, keys: Key) -> None:
+async def dbms_save_relayed_key(ksid: orm.Ksid, keys: RawKey) -> None:
     """Saves the key to relay the key of a Ksid."""
     logging.getLogger().info(f"SAVING RELAYED KEY {keys.key}")
     await orm.LocalKey.objects.create(key_id=keys.key_ID, key=keys.key, ksid=ksid.ksid)
 
 
 # OK
-async def dbms_get_encryption_key(ksid: orm.Ksid) -> Key:
-    """Saves the key to relay the key of a Ksid."""
-    key: orm.LocalKey = await orm.LocalKey.objects.filter(ksid=ksid.ksid).first()
+async def dbms_get_encryption_key(ksid: orm.Ksid, key_id: UUID | None = None) -> RawKey:
+    """Gets the key relayed to encrypt the keys of a Ksid, with the given id if known, deleting it."""
+    if key_id is not None:
+        key: orm.LocalKey = await orm.LocalKey.objects.filter(ksid=ksid.ksid, key_id=key_id).first()
+    else:
+        key: orm.LocalKey = await orm.LocalKey.objects.filter(ksid=ksid.ksid).first()
     if key is not None:
         await key.delete()
-        return Key(key_ID=key.key_id, key=key.key)
+        return RawKey(key_ID=key.key_id, key=key.key)
     else:
         raise HTTPException(
             status_code=500,
@@ -317,137 +490,220 @@ async def __get_block_by_id(block_id: UUID) -> orm.Block:
         # )
 
 
-@dataclass(frozen=True, slots=True)
-class Instruction:
-    """An instruction on how to retrieve key material from a block.
+async def dbms_get_available_material(link_id: UUID) -> int:
+    """Gets the number of bytes of the link not consumed yet, in the blocks not expired."""
+    return get_pool(link_id).available()
 
-    'start' and 'end' works like for function range(): 'start' is included,
-    'end' excluded.
-    """
 
-    block_id: UUID
-    start: int
-    end: int
-
-    def __post_init__(self) -> None:
-        if self.start >= self.end:
-            raise ValueError(
-                f"Instruction for block {self.block_id} has start "
-                f"{self.start} >= end {self.end}"
-            )
-
-
-async def __pop_block(link_id: UUID) -> orm.Block | None:
-    """Retrieves a block from the database, removing it from there.
-
-    This function exploits an async lock, because it has to ensure that the database
-    does not return the very same block to multiple requests, before deleting that
-    block from the database. The behaviour of pick_block() has to be similar to the
-    one of list.pop() or Queue.get_nowait()."""
-    logging.getLogger().info(f"INFO pop block to generate key")
-    async with lock_blocks:
-        b: orm.Block = (
-            await orm.Block.objects.filter(
-                available_bits__gt=0, link_id=link_id
-            ).filter(
-                timestamp__gt=now() - Config.TTL
-            ).first()
-        )
-        return b
-
-
-async def update_available_bits(block_id: UUID, used: int) -> None:
+async def update_available_bits(block_id: UUID, end: int, in_use: int = 1) -> None:
+    """Moves the cursor of the block to 'end', if behind it, and adds 'in_use' to the keys of the companion using it."""
     logging.getLogger().info("INFO updating available bits")
-    async with lock_blocks:
-        block: orm.Block = await __get_block_by_id(block_id=block_id)
-        avb = block.available_bits - used
-        in_use = block.in_use
-        in_use += 1
-        await block.update(available_bits=avb, in_use=in_use)
-
-
-async def __get_randbits(req_bitlength: int, link: orm.Link, use: bool) -> tuple[list[int], list[Instruction]]:
-    """Asks the quantum channel for new blocks.
-
-    If sd_qkd_node does not have a sufficient number of random bits locally, it is forced to
-    communicate with the quantum channel, asking for such bits.
+    pool_block, pool = __find_in_pools(block_id)
+    if pool_block is not None:
+        pool.advance(pool_block, end)
+        pool.update(pool_block, in_use=in_use)
+        return
+    table = orm.Block.objects.table
+    await __get_block_by_id(block_id=block_id)
+    await local_db.execute(table.update().where(table.c.block_id == block_id).values(
+        available_bits=func.min(table.c.available_bits, func.length(table.c.material) - end),
+        in_use=table.c.in_use + in_use
+    ))
+
+
+async def dbms_apply_block_used(request: BlockUsedRequest) -> None:
+    """Applies the updates of the blocks used by the companion KME, in order and only once.
+
+    The updates of the stream already applied, e.g. sent again after a failure, are skipped.
     """
-    logging.getLogger().info(f"INFO getting rand bits")
-    key_material: list[int] = []
-    instructions: list[Instruction] = []
+    for u in sorted(request.updates, key=lambda u: u.seq):
+        if u.seq <= applied_block_used.get(request.stream, 0):
+            continue
+        # marked before applying it, to skip it in a concurrent request as well
+        applied_block_used[request.stream] = u.seq
+        try:
+            await update_available_bits(block_id=u.block_id, end=u.end, in_use=u.in_use)
+        except BlockNotFound:
+            logging.getLogger().error(f"Byte update on block ...{str(u.block_id)[25:]} failed.")
 
-    while (diff := req_bitlength - bit_length(key_material)) > 0:
-        b: orm.Block | None = await __pop_block(link_id=link.link_id)
 
-        if b is None:
-            # logging.getLogger().error(f"ERROR run out of blocks.")
-            raise BlockNotFound()
-            # raise HTTPException(
-            #    status_code=500,
-            #    detail="Insufficient key material."
-            # )
+def __owns(block_id: UUID, companion: UUID) -> bool:
+    """Whether keys are generated from the block by this KME or by the companion.
 
-        start = len(b.material) - b.available_bits
+    The blocks of a link are split between its ends by the parity of their id, so the two KMEs
+    never take the same bytes: in Config.SHARED_CURSOR mode they do not tell each other the
+    bytes used, otherwise they tell it in batches, too late to prevent taking them twice.
+    """
+    return (block_id.int % 2 == 0) == (Config.KME_ID.int < companion.int)
 
-        if bit_length(b.material[start:]) > diff:
-            end = start + diff // 8
-        else:
-            end = len(b.material)
-        in_use = b.in_use
-        if use:
-            # 'in_use' is incremented only if it is a direct key, not a relayed one, because the relayed ones are not
-            # retrieved by the successive KME, thus 'in_use' would not be decremented, preventing the blocks to be
-            # deleted when expired
-            in_use += 1
-        await b.update(available_bits=len(b.material) - end, in_use=in_use)
 
-        companion_kme_addr: str = await dbms_get_kme_address(dst=link.companion)
-        await kme_update_block(addr=companion_kme_addr, block_id=b.block_id, used=end - start)
+def __find_in_pools(block_id: UUID) -> tuple[PoolBlock | None, KeyPool | None]:
+    """Finds a block in the pools of the links, with its pool."""
+    for pool in pools.values():
+        if (b := pool.get(block_id)) is not None:
+            return b, pool
+    return None, None
 
-        instructions.append(Instruction(b.block_id, start, end))
-        key_material.extend(b.material[start:end])
 
-    return key_material, instructions
+async def __get_randbits(
+        req_bitlength: int, link: orm.Link, use: bool, number: int = 1
+) -> list[tuple[bytearray, list[Instruction]]]:
+    """Takes the material of 'number' keys of 'req_bitlength' bits from the pool of the link.
 
+    The material of all the keys is reserved with a single allocation, then split among them.
+    """
+    logging.getLogger().info(f"INFO getting rand bits")
+    size = req_bitlength // 8
+    pool = get_pool(link.link_id)
+
+    # 'in_use' is incremented only if it is a direct key, not a relayed one, because the relayed ones are not
+    # retrieved by the successive KME, thus 'in_use' would not be decremented, preventing the blocks to be
+    # deleted when expired
+    fragments = pool.allocate(
+        size=size * number, use=use,
+        owned=lambda block_id: __owns(block_id, link.companion)
+    )
+    if fragments is None:
+        # logging.getLogger().error(f"ERROR run out of blocks.")
+        raise BlockNotFound()
 
-async def __generate_key_material(req_bitlength: int, link: orm.Link, use: bool) -> tuple[str, object]:
+    companion_kme_addr: str | None = None
+    if not Config.SHARED_CURSOR:
+        companion_kme_addr = await dbms_get_kme_address(dst=link.companion)
+    keys: list[tuple[bytearray, list[Instruction]]] = []
+    key_material = bytearray()
+    instructions: list[Instruction] = []
+    for b, start, end in fragments:
+        # a fragment is split if it crosses the end of a key
+        pieces = 0
+        while start < end:
+            piece_end = min(end, start + size - len(key_material))
+            if companion_kme_addr is not None:
+                notify_block_used(addr=companion_kme_addr, block_id=b.block_id, end=piece_end)
+            instructions.append(Instruction(b.block_id, start, piece_end))
+            key_material.extend(pool.material(b, start, piece_end))
+            start = piece_end
+            pieces += 1
+            if len(key_material) == size:
+                keys.append((key_material, instructions))
+                key_material, instructions = bytearray(), []
+        if use and pieces > 1:
+            # allocate() counted the block once, but each key retrieved releases it
+            pool.update(b, in_use=pieces - 1)
+    pool.count_keys(keys=number, fragments=sum(len(i) for _, i in keys))
+
+    return keys
+
+
+async def __generate_key_material(req_bitlength: int, link: orm.Link, use: bool) -> tuple[bytes, bytes]:
     """
-    Returns key_material encoded as a base64 string, with the 'req_bitlength'
+    Returns key_material as bytes, with the 'req_bitlength'
     requested. Alongside the key material, the instructions to re-build it,
     given the exploited blocks, is returned. These instructions have to be
     stored inside the database shared between communicating KMEs.
     """
+    return (await __generate_keys_material(req_bitlength=req_bitlength, link=link, use=use, number=1))[0]
+
+
+async def __generate_keys_material(
+        req_bitlength: int, link: orm.Link, use: bool, number: int
+) -> list[tuple[bytes, bytes]]:
+    """
+    Returns the key material and the instructions of 'number' keys, like
+    __generate_key_material, taken from the blocks together.
+    """
     logging.getLogger().info(f"INFO generating key material")
     assert req_bitlength % 8 == 0
 
     try:
-        key_material, instructions = await __get_randbits(req_bitlength=req_bitlength, link=link, use=use)
+        keys = await __get_randbits(req_bitlength=req_bitlength, link=link, use=use, number=number)
     except BlockNotFound:
         raise BlockNotFound()
-    return collectionint_to_b64(key_material), dump(instructions)
+    return [(bytes(key_material), encode_instructions(instructions)) for key_material, instructions in keys]
 
 
-async def __retrieve_key_material(json_instructions: object) -> str:
+async def __retrieve_key_material(encoded_instructions: bytes) -> bytes:
     """
     Returns the key material re-created based on the given instructions.
     """
-    logging.getLogger().info("INFO retrieve key material")
-    key_material_ints: list[int] = []
+    return (await __retrieve_keys_material([encoded_instructions]))[0]
+
 
-    instructions = load(json_instructions, tuple[Instruction, ...])
+async def __retrieve_keys_material(encoded_instructions: list[bytes]) -> list[bytes]:
+    """
+    Returns the key material of many keys, re-created based on their instructions.
 
-    async with lock_blocks:
+    The blocks not in the pools are read with a single query, and updated with a
+    single statement.
+    """
+    logging.getLogger().info("INFO retrieve key material")
+    keys_instructions = [decode_instructions(e) for e in encoded_instructions]
+
+    table = orm.Block.objects.table
+    in_pools: dict[UUID, tuple[PoolBlock, KeyPool]] = {}
+    # the bytes of the instructions on the pools, copied before any await: meanwhile new blocks can
+    # overwrite them in the ring
+    copied: list[list[bytes | None]] = []
+    on_db: set[UUID] = set()
+    for instructions in keys_instructions:
+        copied.append([])
         for i in instructions:
-            try:
-                b = await __get_block_by_id(block_id=i.block_id)
-            except BlockNotFound:
-                raise BlockNotFound()
-            in_use = b.in_use
-            in_use -= 1
-            await b.update(in_use=in_use)
-            key_material_ints.extend(b.material[i.start: i.end])
+            pool_block, pool = __find_in_pools(i.block_id)
+            if pool_block is not None:
+                in_pools[i.block_id] = pool_block, pool
+                copied[-1].append(pool.material(pool_block, i.start, i.end))
+            else:
+                on_db.add(i.block_id)
+                copied[-1].append(None)
+    rows = {}
+    if on_db:
+        rows = {
+            r["block_id"]: r
+            for r in await local_db.fetch_all(table.select().where(table.c.block_id.in_(list(on_db))))
+        }
+        if len(rows) < len(on_db):
+            raise BlockNotFound()
 
-    return collectionint_to_b64(key_material_ints)
+    materials: list[bytes] = []
+    # for each block on the db: the number of keys retrieved from it, or the end of the bytes used
+    db_updates: dict[UUID, int] = {}
+    lengths: dict[UUID, int] = {block_id: len(r["material"]) for block_id, r in rows.items()}
+    for instructions, pieces in zip(keys_instructions, copied):
+        key_material = bytearray()
+        for i, piece in zip(instructions, pieces):
+            if piece is not None:
+                key_material.extend(piece)
+                pool_block, pool = in_pools[i.block_id]
+                if pool.get(i.block_id) is pool_block:
+                    if Config.SHARED_CURSOR:
+                        # the cursor is moved past the bytes of the key, as the companion did when generating it
+                        pool.advance(pool_block, i.end)
+                    else:
+                        pool.update(pool_block, in_use=-1)
+                    continue
+                # dropped from the pool during the query, its state is on the db now
+                lengths[i.block_id] = pool_block.length
+            else:
+                key_material.extend(rows[i.block_id]["material"][i.start: i.end])
+            if Config.SHARED_CURSOR:
+                db_updates[i.block_id] = max(db_updates.get(i.block_id, 0), i.end)
+            else:
+                db_updates[i.block_id] = db_updates.get(i.block_id, 0) + 1
+        materials.append(bytes(key_material))
+
+    if db_updates:
+        if Config.SHARED_CURSOR:
+            values = {"available_bits": func.min(table.c.available_bits, case(*[
+                (table.c.block_id == block_id, lengths[block_id] - end)
+                for block_id, end in db_updates.items()
+            ]))}
+        else:
+            values = {"in_use": table.c.in_use - case(*[
+                (table.c.block_id == block_id, count) for block_id, count in db_updates.items()
+            ])}
+        await local_db.execute(table.update().where(table.c.block_id.in_(list(db_updates))).values(**values))
+
+    return materials
 
 # ---------------- END ACTUAL KEY GENERATION/RETRIEVING ----------------
 
@@ -494,6 +750,7 @@ async def dbms_delete_ksid(ksid_to_del: orm.Ksid) -> tuple[bool, bool, str]:
     # if first or last:
     #    await __delete_saes((ksid_to_del.src, ksid_to_del.dst))
     await ksid_to_del.delete()
+    relay_locks.pop(ksid_to_del.ksid, None)
     return first, last, next_kme_addr
     # TODO delete local keys not utilized
 
@@ -507,14 +764,21 @@ async def dbms_save_link(link_id: UUID, ttl: int, rate: float) -> bool:
     )
     if not created:
         await link.update(rate=rate)
+    __forget_link(link_id)
     return created
 
 
 async def dbms_update_link(link_id: UUID, **kwargs) -> None:
     """Updates the link info received by the SDN Controller about the companion KME."""
-    async with lock_links:
-        await orm.Link.objects.filter(link_id=link_id).update(**kwargs)
-        logging.getLogger().info(f"Link {link_id}, {kwargs}")
+    await orm.Link.objects.filter(link_id=link_id).update(**kwargs)
+    __forget_link(link_id)
+    logging.getLogger().info(f"Link {link_id}, {kwargs}")
+
+
+def __forget_link(link_id: UUID) -> None:
+    """Removes the link from links_by_companion, to be read again from the database."""
+    for companion in [c for c, link in links_by_companion.items() if link.link_id == link_id]:
+        del links_by_companion[companion]
 
 
 async def dbms_get_kme_address(dst: UUID) -> str:
@@ -529,7 +793,7 @@ class Block:
 
     time: int
     id: UUID
-    key: tuple[int, ...]
+    key: bytes
     link_id: UUID
 
 
@@ -539,10 +803,97 @@ async def create_from_qcs_block(qcs_block: Block) -> None:
     await orm.Block.objects.create(
         link_id=qcs_block.link_id,
         block_id=qcs_block.id,
-        material=qcs_block.key,
+        material=bytes(qcs_block.key),
         timestamp=qcs_block.time,
         available_bits=len(qcs_block.key),
     )
+    await __add_to_pool([qcs_block])
+
+
+async def create_from_qcs_blocks(qcs_blocks: list[Block]) -> None:
+    """Saves the blocks received by the qc with a single insert.
+
+    The blocks already saved, e.g. sent again by the qc after a reconnection racing with the
+    previous batch, or after a restart of the KME, are skipped.
+    """
+    table = orm.Block.objects.table
+    saved = {
+        r[0] for r in await local_db.fetch_all(
+            select(table.c.block_id).where(table.c.block_id.in_([b.id for b in qcs_blocks]))
+        )
+    }
+    qcs_blocks = [b for b in qcs_blocks if b.id not in saved]
+    if not qcs_blocks:
+        return
+    # a concurrent insert of the same blocks is ignored, not to fail the whole batch
+    await local_db.execute(table.insert().prefix_with("OR IGNORE").values([
+        {
+            "link_id": b.link_id,
+            "block_id": b.id,
+            "material": bytes(b.key),
+            "timestamp": b.time,
+            "available_bits": len(b.key),
+            "in_use": 0,
+        } for b in qcs_blocks
+    ]))
+    await __add_to_pool(qcs_blocks)
+
+
+async def __add_to_pool(qcs_blocks: list[Block]) -> None:
+    """Adds the blocks, already saved, to the pool of their link.
+
+    The state of the blocks dropped from the pool to make room is saved right away, since
+    from now on they are looked up in the database.
+    """
+    dropped: list[PoolBlock] = []
+    for b in qcs_blocks:
+        pool = get_pool(b.link_id)
+        if pool.get(b.id) is not None:
+            # added by a concurrent batch with the same block
+            continue
+        dropped.extend(d for d in pool.add(b) if pool.dirty.pop(d.block_id, None) is not None)
+    await __save_pool_blocks(dropped)
+
+
+async def dbms_load_pools() -> int:
+    """Rebuilds the pools of the links from the blocks not expired in the database, e.g. after a crash.
+
+    The blocks are added in the order they arrived, with their state as last saved. Returns the
+    number of blocks read.
+    """
+    table = orm.Block.objects.table
+    rows = await local_db.fetch_all(
+        table.select().where(table.c.timestamp > now() - Config.TTL).order_by(table.c.timestamp, table.c.id)
+    )
+    for r in rows:
+        pool = get_pool(r["link_id"])
+        # the blocks dropped to make room are already saved, they are looked up in the database
+        pool.add(Block(r["timestamp"], r["block_id"], r["material"], r["link_id"]))
+        if (b := pool.get(r["block_id"])) is not None:
+            pool.restore(b, available=r["available_bits"], in_use=r["in_use"])
+    return len(rows)
+
+
+async def dbms_save_pools() -> None:
+    """Saves the state of the blocks changed in the pools since the last time."""
+    changed: list[PoolBlock] = []
+    for pool in pools.values():
+        changed.extend(pool.dirty.values())
+        pool.dirty.clear()
+    await __save_pool_blocks(changed)
+
+
+async def __save_pool_blocks(blocks: list[PoolBlock]) -> None:
+    """Writes the state of blocks of the pools to the database, with a statement every SAVE_CHUNK blocks."""
+    table = orm.Block.objects.table
+    for i in range(0, len(blocks), SAVE_CHUNK):
+        chunk = blocks[i:i + SAVE_CHUNK]
+        await local_db.execute(table.update().where(
+            table.c.block_id.in_([b.block_id for b in chunk])
+        ).values(
+            available_bits=case(*[(table.c.block_id == b.block_id, b.available) for b in chunk]),
+            in_use=case(*[(table.c.block_id == b.block_id, b.in_use) for b in chunk]),
+        ))
 
 
 # SAEs
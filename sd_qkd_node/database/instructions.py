@@ -0,0 +1,83 @@
+"""The instructions to re-build the key material of a key, as stored in the shared database.
+
+The instructions of a key are encoded in BINARY, that is the VERSION byte followed, for each
+instruction, by the 16 bytes of the id of the block and by its start and its length as varints
+(7 bits per byte, least significant first, the highest bit set on all the bytes but the last).
+
+Keys stored by older KMEs have their instructions in JSON, as a list of Instruction objects:
+since they start with "[", they are told apart from the first byte and can still be decoded.
+"""
+import json
+from dataclasses import dataclass
+from typing import Final
+from uuid import UUID
+
+from sd_qkd_node.encoder import load
+
+VERSION: Final[int] = 1
+# The first byte of the instructions encoded in JSON
+JSON_START: Final[int] = ord("[")
+
+
+@dataclass(frozen=True, slots=True)
+class Instruction:
+    """An instruction on how to retrieve key material from a block.
+
+    'start' and 'end' works like for function range(): 'start' is included,
+    'end' excluded.
+    """
+
+    block_id: UUID
+    start: int
+    end: int
+
+    def __post_init__(self) -> None:
+        if self.start >= self.end:
+            raise ValueError(
+                f"Instruction for block {self.block_id} has start "
+                f"{self.start} >= end {self.end}"
+            )
+
+
+def encode_instructions(instructions: list[Instruction]) -> bytes:
+    """Encodes the instructions of a key in BINARY."""
+    data = bytearray((VERSION,))
+    for i in instructions:
+        data += i.block_id.bytes
+        __put_varint(data, i.start)
+        __put_varint(data, i.end - i.start)
+    return bytes(data)
+
+
+def decode_instructions(data: bytes) -> tuple[Instruction, ...]:
+    """Decodes the instructions of a key, encoded in BINARY or in JSON."""
+    if data[0] == JSON_START:
+        return load(json.loads(data), tuple[Instruction, ...])
+    if data[0] != VERSION:
+        raise ValueError(f"Unsupported instructions version {data[0]}")
+    instructions: list[Instruction] = []
+    position = 1
+    while position < len(data):
+        block_id = UUID(bytes=data[position:position + 16])
+        start, position = __get_varint(data, position + 16)
+        length, position = __get_varint(data, position)
+        instructions.append(Instruction(block_id, start, start + length))
+    return tuple(instructions)
+
+
+def __put_varint(data: bytearray, n: int) -> None:
+    while n >= 0x80:
+        data.append(n & 0x7F | 0x80)
+        n >>= 7
+    data.append(n)
+
+
+def __get_varint(data: bytes, position: int) -> tuple[int, int]:
+    """The varint at 'position', and the position of the byte following it."""
+    n = 0
+    shift = 0
+    while data[position] & 0x80:
+        n |= (data[position] & 0x7F) << shift
+        shift += 7
+        position += 1
+    return n | data[position] << shift, position + 1
@@ -0,0 +1,89 @@
+"""Migrations of the databases of the KME, applied at startup."""
+import json
+import logging
+from base64 import b64decode
+from collections.abc import Callable, Mapping
+from typing import Final
+from uuid import UUID
+
+import sqlalchemy
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+
+from sd_qkd_node.database import orm, local_db, shared_db
+
+# Rows copied with a single insert while migrating.
+CHUNK: Final[int] = 150
+
+
+async def migrate() -> None:
+    """Applies the migrations needed by the databases, if any."""
+    await __migrate_blocks_to_binary()
+    await __migrate_local_keys_to_binary()
+    await __migrate_instructions_to_binary()
+
+
+async def __migrate_blocks_to_binary() -> None:
+    """Converts the material of the blocks from JSON lists of integers to raw bytes."""
+    await __rebuild(orm.Block.objects.table, "material", "JSON", lambda r: {
+        "link_id": UUID(r["link_id"]),
+        "block_id": UUID(r["block_id"]),
+        "timestamp": r["timestamp"],
+        "material": bytes(json.loads(r["material"])),
+        "available_bits": r["available_bits"],
+        "in_use": r["in_use"],
+    })
+
+
+async def __migrate_local_keys_to_binary() -> None:
+    """Converts the material of the keys stored locally from base64 strings to raw bytes."""
+    await __rebuild(orm.LocalKey.objects.table, "key", "VARCHAR", lambda r: {
+        "key_id": UUID(r["key_id"]),
+        "key": b64decode(r["key"]),
+        "ksid": UUID(r["ksid"]),
+        "relay": r["relay"],
+        "link_id": UUID(r["link_id"]) if r["link_id"] is not None else None,
+    })
+
+
+async def __migrate_instructions_to_binary() -> None:
+    """Converts the instructions of the keys on the shared database from JSON to binary.
+
+    Only a PostgreSQL column needs to change its type: the instructions already stored are
+    kept as their JSON text, that decode_instructions still reads. SQLite can store the
+    new instructions in the old column as they are.
+    """
+    if shared_db.url.dialect != "postgresql":
+        return
+    table = orm.Key.objects.table
+    column = await shared_db.fetch_one(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = 'instructions'",
+        {"table": table.name}
+    )
+    if column is None or column["data_type"] not in ("json", "jsonb"):
+        return
+    await shared_db.execute(
+        f"ALTER TABLE {table.name} ALTER COLUMN instructions TYPE bytea USING convert_to(instructions::text, 'UTF8')"
+    )
+    logging.getLogger().warning(f"Migrated {table.name} to binary instructions")
+
+
+async def __rebuild(
+        table: sqlalchemy.Table, column: str, old_type: str, convert: Callable[[Mapping], dict[str, object]]
+) -> None:
+    """Rebuilds the table if 'column' has a type starting with 'old_type', converting its rows.
+
+    The table is rebuilt, since SQLite cannot change the type of a column.
+    """
+    columns = await local_db.fetch_all(f"PRAGMA table_info({table.name})")
+    if not any(c["name"] == column and c["type"].startswith(old_type) for c in columns):
+        return
+    old = f"{table.name}_old"
+    async with local_db.transaction():
+        await local_db.execute(f"ALTER TABLE {table.name} RENAME TO {old}")
+        await local_db.execute(str(CreateTable(table).compile(dialect=sqlite.dialect())))
+        rows = await local_db.fetch_all(f"SELECT * FROM {old} ORDER BY id")
+        for i in range(0, len(rows), CHUNK):
+            await local_db.execute(table.insert().values([convert(r) for r in rows[i:i + CHUNK]]))
+        await local_db.execute(f"DROP TABLE {old}")
+    logging.getLogger().warning(f"Migrated {len(rows)} rows of {table.name} to binary {column}")
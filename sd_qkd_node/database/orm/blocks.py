@@ -1,7 +1,8 @@
 """Representation of a Block inside the database."""
-from orm import Model, Integer, UUID, JSON
+from orm import Model, Integer, UUID
 
 from sd_qkd_node.database import local_models
+from sd_qkd_node.database.orm.fields import Binary
 
 
 class Block(Model):  # type: ignore
@@ -10,7 +11,7 @@ class Block(Model):  # type: ignore
     link_id: UUID
     block_id: UUID
     timestamp: int
-    material: list[int]
+    material: bytes
     available_bits: int
     in_use: int
 
@@ -21,7 +22,7 @@ class Block(Model):  # type: ignore
         "link_id": UUID(allow_null=False),
         "block_id": UUID(unique=True, allow_null=False),
         "timestamp": Integer(allow_null=False),
-        "material": JSON(allow_null=False),
+        "material": Binary(allow_null=False),
         "available_bits": Integer(allow_null=False),
         "in_use": Integer(allow_null=False, default=0, unique=False)
     }
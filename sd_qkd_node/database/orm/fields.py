@@ -0,0 +1,34 @@
+"""Fields of the ORM models not provided by the orm package."""
+import sqlalchemy
+import typesystem
+from orm.fields import ModelField
+
+
+class Binary(ModelField):
+    """Raw bytes, stored as a BLOB."""
+
+    def get_validator(self, **kwargs) -> typesystem.Field:
+        return typesystem.Any(**kwargs)
+
+    def get_column_type(self) -> sqlalchemy.types.TypeEngine:
+        return sqlalchemy.LargeBinary()
+
+
+class _BinaryOrText(sqlalchemy.LargeBinary):
+    """LargeBinary that also reads text, as its UTF-8 bytes."""
+
+    cache_ok = True
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if isinstance(value, str):
+                return value.encode()
+            return bytes(value) if value is not None else None
+        return process
+
+
+class BinaryOrText(Binary):
+    """Raw bytes, stored as a BLOB, in a column that can still hold the text stored before it was binary."""
+
+    def get_column_type(self) -> sqlalchemy.types.TypeEngine:
+        return _BinaryOrText()
@@ -1,7 +1,8 @@
 """Representation of a Key inside the database."""
-from orm import Model, Integer, UUID, JSON, Boolean
+from orm import Model, Integer, UUID, Boolean
 
 from sd_qkd_node.database import shared_models
+from sd_qkd_node.database.orm.fields import BinaryOrText
 
 
 class Key(Model):  # type: ignore
@@ -9,7 +10,7 @@ class Key(Model):  # type: ignore
 
     key_id: UUID
     ksid: UUID
-    instructions: object
+    instructions: bytes
     relay: bool
     # when link_id is not assigned the key is a direct/relay key to be delivered to SAEs
     # otherwise it is an enc/dec key for key relay
@@ -22,6 +23,6 @@ class Key(Model):  # type: ignore
         "key_id": UUID(unique=True, allow_null=False),
         "ksid": UUID(unique=False, allow_null=False),
         "relay": Boolean(unique=False, default=False),
-        "instructions": JSON(allow_null=False),
+        "instructions": BinaryOrText(allow_null=False),
         "link_id": UUID(unique=False, allow_null=True)
     }
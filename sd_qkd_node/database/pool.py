@@ -0,0 +1,252 @@
+"""The key material of the links, kept in memory to generate keys without querying the database."""
+import logging
+from bisect import bisect_left, insort
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from uuid import UUID
+
+from qcs import Block
+from sd_qkd_node.configs import Config
+from sd_qkd_node.utils import now
+
+
+@dataclass(slots=True)
+class PoolBlock:
+    """The position and the state of a block inside a KeyPool.
+
+    'offset' is the position of its first byte in the stream of all the bytes added to
+    the pool, the ring is indexed by 'offset' modulo its capacity.
+    """
+
+    block_id: UUID
+    offset: int
+    length: int
+    timestamp: int
+    available: int
+    in_use: int = 0
+
+    @property
+    def expired(self) -> bool:
+        return self.timestamp <= now() - Config.TTL
+
+    @property
+    def index_key(self) -> tuple[int, int]:
+        """The position of the block in the index of KeyPool: by available bytes, then oldest first."""
+        return self.available, self.offset
+
+    @property
+    def reclaimable(self) -> bool:
+        """True if the block can be dropped, like the Reaper does in the database."""
+        return self.in_use == 0 and (self.available == 0 or self.expired)
+
+
+class KeyPool:
+    """The key material of a link, in a ring buffer of 'capacity' bytes.
+
+    The blocks are kept in the order they arrived, and keys are made of the first available
+    bytes of the blocks not expired chosen by allocate(). Taking key material is a slice of
+    the ring plus the advance of the block's cursor ('available').
+
+    When a new block does not fit, the oldest blocks are dropped: the database still has
+    them (see dbms), so they can be looked up there. The blocks whose state changed since
+    they were last written to the database are kept in 'dirty'.
+
+    The blocks with available bytes are also indexed by their available bytes, so allocate()
+    finds the best fit by bisection instead of scanning all the blocks.
+    """
+
+    def __init__(self, capacity: int = Config.POOL_SIZE) -> None:
+        self.capacity = capacity
+        self.dirty: dict[UUID, PoolBlock] = {}
+        # keys taken from the pool and their fragments, since its creation
+        self.keys = 0
+        self.fragments = 0
+        self.__ring = bytearray(capacity)
+        self.__end = 0
+        self.__blocks: deque[PoolBlock] = deque()
+        self.__by_id: dict[UUID, PoolBlock] = {}
+        # the blocks with available bytes, sorted by index_key, the expired ones dropped when met
+        self.__usable: list[tuple[int, int, PoolBlock]] = []
+        # the blocks rejected by the 'owned' of allocate(), not indexed anymore
+        self.__not_owned: set[UUID] = set()
+
+    def __len__(self) -> int:
+        return len(self.__blocks)
+
+    def add(self, block: Block) -> list[PoolBlock]:
+        """Adds a new block, returning the blocks dropped to make room for it."""
+        length = len(block.key)
+        if length > self.capacity:
+            return []
+        dropped = self.__make_room(length)
+        position = self.__end % self.capacity
+        head = min(length, self.capacity - position)
+        self.__ring[position:position + head] = block.key[:head]
+        self.__ring[:length - head] = block.key[head:]
+        pool_block = PoolBlock(block.id, self.__end, length, block.time, length)
+        self.__end += length
+        self.__blocks.append(pool_block)
+        self.__by_id[block.id] = pool_block
+        self.__index(pool_block)
+        return dropped
+
+    @property
+    def fragments_per_key(self) -> float:
+        """The average number of blocks the keys have been taken from."""
+        return self.fragments / self.keys if self.keys > 0 else 0
+
+    def count_keys(self, keys: int, fragments: int) -> None:
+        """Counts 'keys' keys taken from the pool, made of 'fragments' fragments in total."""
+        self.keys += keys
+        self.fragments += fragments
+
+    def get(self, block_id: UUID) -> PoolBlock | None:
+        """The block with the given id, if in the pool."""
+        return self.__by_id.get(block_id)
+
+    def allocate(
+            self, size: int, use: bool, owned: Callable[[UUID], bool] | None = None
+    ) -> list[tuple[PoolBlock, int, int]] | None:
+        """Takes 'size' bytes from the blocks not expired, in as few fragments as possible.
+
+        While no block holds all the bytes still needed, the one with the most available is
+        taken whole. The rest comes from the block with the fewest available bytes that holds
+        it (best fit), so small remainders are used up instead of splitting large blocks.
+        Ties go to the oldest block. If 'owned' is given, only the blocks whose id it accepts
+        are taken from: it must give the same answer for a block in every call, the blocks it
+        rejects are set aside.
+
+        Returns the fragments: the blocks, with the start and the end of the bytes taken, as
+        in Instruction. Returns None, taking nothing, if the available bytes are not enough.
+        The 'in_use' of the blocks is incremented if 'use'.
+        """
+        cutoff = now() - Config.TTL
+        # the blocks are taken out of the index while choosing them, and put back if not enough
+        chosen: list[tuple[PoolBlock, int]] = []
+        while size > 0:
+            b = self.__take_best_fit(size, cutoff, owned)
+            if b is None:
+                for b, _ in chosen:
+                    self.__index(b)
+                return None
+            taken = min(size, b.available)
+            chosen.append((b, taken))
+            size -= taken
+        fragments: list[tuple[PoolBlock, int, int]] = []
+        for b, taken in chosen:
+            start = b.length - b.available
+            b.available -= taken
+            if b.available > 0:
+                self.__index(b)
+            b.in_use += 1 if use else 0
+            self.dirty[b.block_id] = b
+            fragments.append((b, start, start + taken))
+        return fragments
+
+    def material(self, b: PoolBlock, start: int, end: int) -> bytes:
+        """The bytes of the block in [start, end)."""
+        position = (b.offset + start) % self.capacity
+        length = end - start
+        if position + length <= self.capacity:
+            return bytes(self.__ring[position:position + length])
+        return bytes(self.__ring[position:]) + bytes(self.__ring[:position + length - self.capacity])
+
+    def update(self, b: PoolBlock, used: int = 0, in_use: int = 0) -> None:
+        """Consumes 'used' bytes of the block and changes its 'in_use' by the given amount."""
+        self.__set_available(b, b.available - used)
+        b.in_use += in_use
+        self.dirty[b.block_id] = b
+
+    def restore(self, b: PoolBlock, available: int, in_use: int) -> None:
+        """Sets the state of the block as last saved in the database, e.g. when reloading it."""
+        self.__set_available(b, available)
+        b.in_use = in_use
+
+    def reap(self) -> list[PoolBlock]:
+        """Drops the oldest blocks while they are reclaimable, returning them.
+
+        Only the head of the ring can be freed, the reclaimable blocks after a useful one
+        are kept until it is dropped as well.
+        """
+        reaped: list[PoolBlock] = []
+        while self.__blocks and self.__blocks[0].reclaimable:
+            b = self.__blocks.popleft()
+            del self.__by_id[b.block_id]
+            self.__unindex(b)
+            self.__not_owned.discard(b.block_id)
+            reaped.append(b)
+        return reaped
+
+    def advance(self, b: PoolBlock, end: int) -> None:
+        """Moves the cursor of the block to 'end', if behind it."""
+        self.__set_available(b, min(b.available, b.length - end))
+        self.dirty[b.block_id] = b
+
+    def available(self) -> int:
+        """The bytes not consumed yet, in the blocks not expired."""
+        cutoff = now() - Config.TTL
+        return sum(b.available for b in self.__blocks if b.timestamp > cutoff)
+
+    def __take_best_fit(self, size: int, cutoff: int, owned: Callable[[UUID], bool] | None) -> PoolBlock | None:
+        """Takes out of the index the block to take the next bytes from, as described in allocate().
+
+        The expired blocks and the ones not owned met on the way are dropped from the index, they
+        will not be taken anymore.
+        """
+        usable = self.__usable
+        while usable:
+            # the fewest available bytes but at least 'size', otherwise the most, the oldest block first
+            i = bisect_left(usable, (size,))
+            if i == len(usable):
+                i = bisect_left(usable, (usable[-1][0],))
+            b = usable.pop(i)[2]
+            if b.timestamp <= cutoff:
+                continue
+            if owned is not None and not owned(b.block_id):
+                self.__not_owned.add(b.block_id)
+                continue
+            return b
+        return None
+
+    def __index(self, b: PoolBlock) -> None:
+        insort(self.__usable, (*b.index_key, b))
+
+    def __unindex(self, b: PoolBlock) -> None:
+        i = bisect_left(self.__usable, b.index_key)
+        if i < len(self.__usable) and self.__usable[i][2] is b:
+            del self.__usable[i]
+
+    def __set_available(self, b: PoolBlock, available: int) -> None:
+        """Changes the available bytes of the block, keeping the index sorted."""
+        if available == b.available:
+            return
+        self.__unindex(b)
+        b.available = available
+        if available > 0 and b.block_id not in self.__not_owned:
+            self.__index(b)
+
+    def __make_room(self, length: int) -> list[PoolBlock]:
+        """Drops the oldest blocks until 'length' bytes are free."""
+        dropped: list[PoolBlock] = []
+        while self.__blocks and self.__end - self.__blocks[0].offset + length > self.capacity:
+            b = self.__blocks.popleft()
+            del self.__by_id[b.block_id]
+            self.__unindex(b)
+            self.__not_owned.discard(b.block_id)
+            dropped.append(b)
+            if not b.reclaimable:
+                logging.getLogger().warning(f"Block ...{str(b.block_id)[25:]} dropped from the pool while still useful")
+        return dropped
+
+
+pools: dict[UUID, KeyPool] = {}
+
+
+def get_pool(link_id: UUID) -> KeyPool:
+    """The pool of the link, created if missing."""
+    try:
+        return pools[link_id]
+    except KeyError:
+        pools[link_id] = KeyPool()
+        return pools[link_id]
@@ -0,0 +1,56 @@
+"""Periodic write of the key pools to the local database."""
+import asyncio
+import logging
+from asyncio import Task
+from uuid import UUID
+
+from sd_qkd_node.configs import Config
+from sd_qkd_node.database.dbms import dbms_save_pools
+from sd_qkd_node.database.pool import pools
+
+
+class PoolWriter:
+    """Writes the changes to the blocks in the key pools to the database every 'interval' seconds.
+
+    The database is only a write-behind log of the pools: the last changes are lost if the
+    KME stops abruptly, and the pools are rebuilt from it when the KME starts again.
+
+    After each write, the fragments per key of the pools keys were taken from are logged.
+    """
+
+    def __init__(self, interval: float = Config.POOL_SAVE_INTERVAL) -> None:
+        self.interval = interval
+        self.__task: Task[None] | None = None
+        # the keys taken from each pool at the last report
+        self.__reported: dict[UUID, int] = {}
+
+    def start(self) -> None:
+        """Starts writing in background."""
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stops writing, after writing the last changes."""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+        await dbms_save_pools()
+
+    def report(self) -> None:
+        """Logs the fragments per key of the pools keys were taken from since the last report."""
+        for link_id, pool in pools.items():
+            if pool.keys != self.__reported.get(link_id, 0):
+                self.__reported[link_id] = pool.keys
+                logging.getLogger().info(
+                    f"Pool of link ...{str(link_id)[25:]}: {pool.keys} keys taken, "
+                    f"{pool.fragments_per_key:.2f} fragments per key"
+                )
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await dbms_save_pools()
+                self.report()
+            except Exception:
+                logging.getLogger().exception("Key pools not saved")
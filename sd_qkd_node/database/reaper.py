@@ -0,0 +1,54 @@
+"""Periodic deletion of the blocks no longer useful from the local database."""
+import asyncio
+import logging
+from asyncio import Task
+
+from sd_qkd_node.configs import Config
+from sd_qkd_node.database.dbms import dbms_reap_blocks
+
+
+class Reaper:
+    """Deletes the blocks expired or consumed every 'interval' seconds, 'batch_size' at a time.
+
+    Keys are fetched without clearing the database first, so their latency does not depend on
+    the size of the blocks table. 'reclaimed_blocks' and 'reclaimed_bytes' count what has been
+    deleted since the start.
+    """
+
+    def __init__(self, interval: float = Config.REAP_INTERVAL, batch_size: int = Config.REAP_BATCH_SIZE) -> None:
+        self.interval = interval
+        self.batch_size = batch_size
+        self.reclaimed_blocks = 0
+        self.reclaimed_bytes = 0
+        self.__task: Task[None] | None = None
+
+    def start(self) -> None:
+        """Starts reaping in background."""
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stops reaping."""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+
+    async def reap(self) -> None:
+        """Deletes the blocks no longer useful and updates the metrics."""
+        blocks, size = await dbms_reap_blocks(self.batch_size)
+        self.reclaimed_blocks += blocks
+        self.reclaimed_bytes += size
+        if blocks > 0:
+            logging.getLogger().info(
+                f"Reclaimed {blocks} blocks, {size} bytes ({self.reclaimed_blocks} blocks, "
+                f"{self.reclaimed_bytes} bytes since start)"
+            )
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap()
+            except Exception:
+                # tried again at the next interval, the task must not stop for good
+                logging.getLogger().exception("Blocks not reaped")
@@ -0,0 +1,141 @@
+"""Background refill of the keys generated ahead for each ksid, in the "qkp" execution mode."""
+import asyncio
+import logging
+from asyncio import Task
+from collections.abc import Awaitable, Callable
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from sd_qkd_node.configs import Config
+from sd_qkd_node.database import orm
+from sd_qkd_node.database.dbms import dbms_count_local_keys
+
+# Generates and stores locally the given number of keys of a ksid, with the given size in bits.
+Refill = Callable[[orm.Ksid, int, int], Awaitable[None]]
+
+
+class Replenisher:
+    """Keeps the keys generated ahead for a ksid between the watermarks, refilling them in background.
+
+    After each request served, if fewer than 'low' keys are left, 'high' minus those left are
+    generated with 'refill', with the size of the last request. 'hits' and 'misses' count the keys
+    served from the ones generated ahead and those generated on request, 'refills', 'refilled_keys'
+    and 'refill_time' the refills done since the start.
+    """
+
+    def __init__(
+            self, ksid: orm.Ksid, size: int, refill: Refill,
+            low: int = Config.QKP_LOW_WATERMARK, high: int = Config.QKP_HIGH_WATERMARK
+    ) -> None:
+        self.ksid = ksid
+        self.size = size
+        self.low = low
+        self.high = high
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refilled_keys = 0
+        self.refill_time = 0.0
+        self.max_refill_time = 0.0
+        self.__refill = refill
+        self.__wake = asyncio.Event()
+        self.__task: Task[None] | None = None
+        self.__stopping = False
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of the keys served that had been generated ahead."""
+        served = self.hits + self.misses
+        return self.hits / served if served > 0 else 0
+
+    @property
+    def mean_refill_time(self) -> float:
+        """The average duration of the refills, in seconds."""
+        return self.refill_time / self.refills if self.refills > 0 else 0
+
+    @property
+    def running(self) -> bool:
+        """True if refilling in background."""
+        return self.__task is not None and not self.__task.done()
+
+    def start(self) -> None:
+        """Starts refilling in background."""
+        self.__stopping = False
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stops refilling."""
+        if self.__task is not None:
+            self.__stopping = True
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+
+    def served(self, size: int, hits: int, misses: int) -> None:
+        """Counts the keys served to a request of keys of 'size' bits, waking the refill."""
+        self.size = size
+        self.hits += hits
+        self.misses += misses
+        self.__wake.set()
+
+    async def replenish(self) -> None:
+        """Refills the keys up to the high watermark, if below the low one."""
+        ready = await dbms_count_local_keys(ksid=self.ksid.ksid)
+        if ready >= self.low:
+            return
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await self.__refill(self.ksid, self.size, self.high - ready)
+        except HTTPException as e:
+            # BlockNotFound as well, when the material of a link is not enough
+            logging.getLogger().error(f"QKP: keys of ksid ...{str(self.ksid.ksid)[25:]} not refilled: {e.detail}")
+            return
+        elapsed = loop.time() - start
+        self.refills += 1
+        self.refilled_keys += self.high - ready
+        self.refill_time += elapsed
+        self.max_refill_time = max(self.max_refill_time, elapsed)
+        logging.getLogger().info(
+            f"QKP: refilled {self.high - ready} keys of ksid ...{str(self.ksid.ksid)[25:]} in "
+            f"{elapsed * 10 ** 3:.1f} ms (hit rate {self.hit_rate:.2f}, mean refill "
+            f"{self.mean_refill_time * 10 ** 3:.1f} ms)"
+        )
+
+    async def __run(self) -> None:
+        # dbms turns a cancellation during a refill into an HTTPException, so the loop checks it as well
+        while not self.__stopping:
+            await self.__wake.wait()
+            self.__wake.clear()
+            try:
+                await self.replenish()
+            except Exception:
+                # tried again after the next request served, the refill must not stop for good
+                logging.getLogger().exception(f"QKP: keys of ksid ...{str(self.ksid.ksid)[25:]} not refilled")
+
+
+replenishers: dict[UUID, Replenisher] = {}
+
+
+def keys_served(ksid: orm.Ksid, size: int, hits: int, misses: int, refill: Refill) -> None:
+    """Counts the keys served to a request on the ksid, starting the refill of its keys if not yet."""
+    try:
+        replenisher = replenishers[ksid.ksid]
+    except KeyError:
+        replenisher = replenishers[ksid.ksid] = Replenisher(ksid, size, refill)
+    if not replenisher.running:
+        replenisher.start()
+    replenisher.served(size, hits, misses)
+
+
+async def remove_replenisher(ksid: UUID) -> None:
+    """Stops the refill of the keys of a ksid, when its connection is closed."""
+    replenisher = replenishers.pop(ksid, None)
+    if replenisher is not None:
+        await replenisher.stop()
+
+
+async def stop_replenishers() -> None:
+    """Stops the refill of the keys of all the ksids."""
+    await asyncio.gather(*(r.stop() for r in replenishers.values()))
@@ -0,0 +1,54 @@
+"""Periodic cut of direct keys in advance, for the key sizes requested the most."""
+import asyncio
+import logging
+from asyncio import Task
+
+from sd_qkd_node.configs import Config
+from sd_qkd_node.database.dbms import dbms_preslice_keys, dbms_release_presliced
+
+
+class Slicer:
+    """Cuts keys from the pools every 'interval' seconds, up to 'depth' for each of the 'sizes' sizes
+    most requested on each link, while the pool has more than 'surplus' bytes available and the keys
+    cut hold at most 'max_bytes' on the link.
+
+    Requests of those sizes are then served by popping a key with its instructions already computed,
+    instead of taking material from the blocks of the pool. The keys not used are given back when
+    stale, when their size is no longer among the most requested, and when the slicer stops.
+    """
+
+    def __init__(
+            self,
+            interval: float = Config.PRESLICE_INTERVAL,
+            depth: int = Config.PRESLICE_DEPTH,
+            sizes: int = Config.PRESLICE_SIZES,
+            surplus: int = Config.PRESLICE_SURPLUS,
+            max_bytes: int = Config.PRESLICE_MAX_BYTES
+    ) -> None:
+        self.interval = interval
+        self.depth = depth
+        self.sizes = sizes
+        self.surplus = surplus
+        self.max_bytes = max_bytes
+        self.__task: Task[None] | None = None
+
+    def start(self) -> None:
+        """Starts cutting keys in background."""
+        if self.depth > 0:
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stops cutting keys, giving back the keys not used."""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+        await dbms_release_presliced()
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await dbms_preslice_keys(self.depth, self.sizes, self.surplus, self.max_bytes)
+            except Exception:
+                logging.getLogger().exception("Keys not cut in advance")
@@ -10,6 +10,7 @@ from sd_qkd_node.configs import Config
 from sd_qkd_node.database.orm import Ksid
 from sd_qkd_node.encoder import dump
 from sd_qkd_node.model import Key
+from sd_qkd_node.model.block_used import BlockUsedRequest
 from sd_qkd_node.model.errors import Error, BlockNotFound
 from sd_qkd_node.model.exchange_key import ExchangeKeyRequest
 from sd_qkd_node.model.key_container import KeyContainer
@@ -18,6 +19,7 @@ from sd_qkd_node.model.new_app import NewAppRequest
 from sd_qkd_node.model.new_kme import NewKmeRequest
 from sd_qkd_node.model.new_link import NewLinkRequest
 from sd_qkd_node.model.open_session import OpenSessionRequest, OpenSessionResponse
+from sd_qkd_node.model.update_links import UpdateLinksRequest, LinkRate
 
 
 async def kme_api_enc_key(master_id: UUID, slave_id: UUID, next_kme_addr: str, size: int = 64) -> None:
@@ -194,15 +196,31 @@ async def sdnc_api_update_link(link_id: UUID, rate: float) -> None:
             )
 
 
-async def kme_update_block(addr: str, block_id: UUID, used: int) -> None:
+async def sdnc_api_update_links(rates: dict[UUID, float]) -> None:
+    request = UpdateLinksRequest(links=[LinkRate(link_id=link_id, rate=rate) for link_id, rate in rates.items()])
+    async with AsyncClient() as client:
+        try:
+            await client.post(
+                url=f"{Config.SDN_CONTROLLER_ADDRESS}/update_links",
+                json=dump(request),
+                timeout=None
+            )
+        except (ConnectError, ReadError):
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to connect"
+            )
+
+
+async def kme_api_block_used(addr: str, request: BlockUsedRequest) -> None:
     async with AsyncClient() as client:
         try:
             logging.getLogger().info(
                 f"INFO -> calling block_used on KME {addr}"
             )
-            await client.post(
+            response: Response = await client.post(
                 url=f"{addr}{Config.KME_BASE_URL}/block_used",
-                params={"block_id": str(block_id), "used": used},
+                json=dump(request),
                 timeout=None
             )
         except (ConnectError, ReadError):
@@ -210,3 +228,8 @@ async def kme_update_block(addr: str, block_id: UUID, used: int) -> None:
                 status_code=500,
                 detail="Failed to connect"
             )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"block_used failed on KME {addr}"
+            )
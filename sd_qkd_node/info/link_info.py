@@ -6,9 +6,16 @@ class Link:
         self.interval = 1
         self.rate = round(bits / self.interval, 2)
         self.alpha = 0.1    # Gives more relevance to last data
+        self.received = 0   # bits received since the last update of the rate
 
     def add_bits(self, bits: int) -> None:
-        self.__ewma(bits)
+        self.received += bits
+
+    def update(self, interval: float) -> None:
+        """Updates the rate with the bits received in the last 'interval' seconds."""
+        self.interval = interval
+        self.__ewma(self.received)
+        self.received = 0
 
     def __ewma(self, bits: int) -> None:
         self.rate = round((bits / self.interval) * self.alpha + (1 - self.alpha) * self.rate, 2)
@@ -27,3 +34,10 @@ def update_rate(link_id: UUID, received_bytes: int) -> tuple[Link, bool]:
         links[link_id] = Link(bits)
     finally:
         return links[link_id], update
+
+
+def update_rates(interval: float) -> dict[UUID, float]:
+    """Updates the rates of all the links with the bits received in the last 'interval' seconds."""
+    for link in links.values():
+        link.update(interval)
+    return {link_id: link.rate for link_id, link in links.items()}
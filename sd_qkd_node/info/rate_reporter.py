@@ -0,0 +1,54 @@
+"""Periodic report of the rates of the links of the KME to the SDN Controller."""
+import asyncio
+import logging
+from asyncio import Task
+
+from fastapi import HTTPException
+
+from sd_qkd_node.configs import Config
+from sd_qkd_node.external_api import sdnc_api_update_links
+from sd_qkd_node.info.link_info import update_rates
+
+
+class RateReporter:
+    """Reports the rates of all the links of the KME every 'interval' seconds, with a single request.
+
+    The rates are the moving averages of the bits received on each link in every interval.
+    """
+
+    def __init__(self, interval: float = Config.RATE_REPORT_INTERVAL) -> None:
+        self.interval = interval
+        self.__task: Task[None] | None = None
+
+    def start(self) -> None:
+        """Starts reporting in background."""
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stops reporting."""
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+
+    async def report(self) -> None:
+        """Updates the rates of the links and reports them."""
+        rates = update_rates(self.interval)
+        if not rates:
+            return
+        try:
+            await sdnc_api_update_links(rates)
+        except HTTPException as e:
+            logging.getLogger().error(f"Rates of the links not reported: {e.detail}")
+
+    async def __run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_report = loop.time()
+        while True:
+            next_report += self.interval
+            await asyncio.sleep(next_report - loop.time())
+            try:
+                await self.report()
+            except Exception:
+                # e.g. an httpx error other than a failed connection
+                logging.getLogger().exception("Rates of the links not reported")
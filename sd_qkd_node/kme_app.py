@@ -5,8 +5,17 @@ from fastapi import FastAPI, Request
 from fastapi.exceptions import HTTPException, RequestValidationError
 from fastapi.responses import JSONResponse, RedirectResponse
 
+from sd_qkd_node.channel.qc_server import QCServer
 from sd_qkd_node.configs import Config
 from sd_qkd_node.database import local_models, local_db, shared_db
+from sd_qkd_node.database.block_notifier import close_queues
+from sd_qkd_node.database.dbms import dbms_load_pools
+from sd_qkd_node.database.migrations import migrate
+from sd_qkd_node.database.pool_writer import PoolWriter
+from sd_qkd_node.database.reaper import Reaper
+from sd_qkd_node.database.replenisher import stop_replenishers
+from sd_qkd_node.database.slicer import Slicer
+from sd_qkd_node.info.rate_reporter import RateReporter
 from sd_qkd_node.model.errors import BadRequest, ServiceUnavailable, Unauthorized
 from sd_qkd_node.routers.kme import dec_keys, enc_keys, status, key_relay, block_used, exchange_key
 from sd_qkd_node.routers.sdn_agent import open_key_session, register_app, link_confirmed, close_connection
@@ -21,6 +30,13 @@ app: Final[FastAPI] = FastAPI(
     },
 )
 
+# started with the app, to receive the blocks in its event loop
+qc_server: Final[QCServer] = QCServer()
+rate_reporter: Final[RateReporter] = RateReporter()
+pool_writer: Final[PoolWriter] = PoolWriter()
+reaper: Final[Reaper] = Reaper()
+slicer: Final[Slicer] = Slicer()
+
 app.include_router(enc_keys.router, prefix=Config.KME_BASE_URL)
 app.include_router(dec_keys.router, prefix=Config.KME_BASE_URL)
 app.include_router(status.router, prefix=Config.KME_BASE_URL)
@@ -45,11 +61,26 @@ async def startup() -> None:
     await local_models.create_all()
     await local_db.connect()
     await shared_db.connect()
+    await migrate()
+    # the blocks left by a KME stopped abruptly are used again
+    await dbms_load_pools()
+    await qc_server.start()
+    rate_reporter.start()
+    pool_writer.start()
+    reaper.start()
+    slicer.start()
 
 
 @app.on_event("shutdown")
 async def shutdown() -> None:
-    """Disconnect from shared DB."""
+    """Stop listening to the quantum channel and disconnect from shared DB."""
+    await qc_server.stop()
+    await rate_reporter.stop()
+    await slicer.stop()
+    await stop_replenishers()
+    await reaper.stop()
+    await close_queues()
+    await pool_writer.stop()
     await local_models.drop_all()
     await local_db.disconnect()
     await shared_db.disconnect()
@@ -1,6 +1,7 @@
 """The implementation of the model of sd_qkd_node."""
 from sd_qkd_node.model.key_container import Key
+from sd_qkd_node.model.raw_key import RawKey
 from sd_qkd_node.model.status import Status
 
 
-__all__ = ["Key", "Status"]
+__all__ = ["Key", "RawKey", "Status"]
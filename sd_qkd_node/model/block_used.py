@@ -0,0 +1,25 @@
+"""Classes for handle requests of updating the blocks used by the companion KME."""
+from uuid import UUID
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class BlockUsed:
+    """The bytes of a block used by the companion KME, with the position of the update in its stream.
+
+    'end' is the end of the bytes used, as in Instruction: the cursor of the block is moved to it,
+    so the updates can be applied in any order.
+    'in_use' is added to the 'in_use' of the block: -1 gives back a key cut and never used.
+    """
+    seq: int
+    block_id: UUID
+    end: int
+    in_use: int = 1
+
+
+@dataclass(frozen=True)
+class BlockUsedRequest:
+    """Request for API block_used, the next updates of a stream."""
+    stream: UUID
+    updates: list[BlockUsed]
@@ -11,3 +11,5 @@ class ExchangeKeyRequest:
     ksid: UUID
     size: int
     keys: KeyContainer
+    # the ID of the key relayed to encrypt them, stored by the last KME among the keys of the ksid
+    relay_key_ID: UUID | None = None
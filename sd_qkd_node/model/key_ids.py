@@ -0,0 +1,27 @@
+"""Contains the implementation of a Key IDs object."""
+from typing import Any
+from uuid import UUID
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class KeyID:
+    """The ID of a key, to be retrieved with 'Get key with key IDs'."""
+
+    key_ID: UUID
+    """ID of the key"""
+
+    key_ID_extension: Any | None = None
+    """(Option) for future use."""
+
+
+@dataclass(frozen=True)
+class KeyIDs:
+    """Key IDs is used for 'Get key with key IDs' with POST."""
+
+    key_IDs: tuple[KeyID, ...]
+    """Array of the IDs of the keys to be retrieved."""
+
+    key_IDs_extension: Any | None = None
+    """(Option) for future use."""
@@ -0,0 +1,27 @@
+"""Contains the implementation of the keys handled inside the KME."""
+from base64 import b64decode, b64encode
+from dataclasses import dataclass
+from uuid import UUID
+
+from sd_qkd_node.model.key_container import Key
+
+
+@dataclass(frozen=True, slots=True)
+class RawKey:
+    """A key with its material as bytes.
+
+    Keys are carried as RawKey inside the KME, and encoded in base64 (see Key) only
+    at the boundaries of its APIs.
+    """
+
+    key_ID: UUID
+    key: bytes
+
+    def encode(self) -> Key:
+        """The Key with this material encoded in base64."""
+        return Key(key_ID=self.key_ID, key=b64encode(self.key).decode("ascii"))
+
+    @classmethod
+    def decode(cls, key: Key) -> "RawKey":
+        """The RawKey of a Key, with its material encoded in base64."""
+        return cls(key_ID=key.key_ID, key=b64decode(key.key, validate=True))
@@ -0,0 +1,17 @@
+"""Classes for handle requests of updating the rates of QC links in the SDN Controller."""
+from uuid import UUID
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class LinkRate:
+    """The current rate of a link."""
+    link_id: UUID
+    rate: float
+
+
+@dataclass(frozen=True)
+class UpdateLinksRequest:
+    """Request for API update_links."""
+    links: list[LinkRate]
@@ -1,11 +1,9 @@
-import logging
 from typing import Final
-from uuid import UUID
 
 from fastapi import APIRouter
 
-from sd_qkd_node.database.dbms import update_available_bits
-from sd_qkd_node.model.errors import BlockNotFound
+from sd_qkd_node.database.dbms import dbms_apply_block_used
+from sd_qkd_node.model.block_used import BlockUsedRequest
 
 router: Final[APIRouter] = APIRouter(tags=["block_used"])
 
@@ -17,12 +15,9 @@ router: Final[APIRouter] = APIRouter(tags=["block_used"])
     include_in_schema=False
 )
 async def block_used(
-    block_id: UUID, used: int
+    request: BlockUsedRequest
 ) -> None:
     """
-    API to set the used bits of the block in the companion KME.
+    API to set the used bits of the blocks in the companion KME, with a batch of updates.
     """
-    try:
-        await update_available_bits(block_id=block_id, used=used)
-    except BlockNotFound:
-        logging.getLogger().error(f"Byte update on block failed.")
+    await dbms_apply_block_used(request)
@@ -1,11 +1,13 @@
 from typing import Final
 from uuid import UUID
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 
+from sd_qkd_node.configs import Config
 from sd_qkd_node.database import orm
-from sd_qkd_node.database.dbms import dbms_get_ksid, dbms_get_key_direct, dbms_get_relayed_key
+from sd_qkd_node.database.dbms import dbms_get_ksid, dbms_get_keys_direct, dbms_get_relayed_keys
 from sd_qkd_node.model.key_container import KeyContainer
+from sd_qkd_node.model.key_ids import KeyIDs
 
 router: Final[APIRouter] = APIRouter(tags=["dec_keys"])
 
@@ -19,14 +21,48 @@ router: Final[APIRouter] = APIRouter(tags=["dec_keys"])
 async def get_key_with_key_i_ds(
     master_sae_id: UUID,
     slave_sae_id: UUID,
-    key_ids: UUID
+    key_ids: list[UUID] = Query(..., description="IDs of the keys requested, repeated for more keys")
 ) -> KeyContainer:
     """
-    API to get the Key for the calling slave SAE.
+    API to get the Keys for the calling slave SAE.
     """
+    return await __get_keys(master_sae_id=master_sae_id, slave_sae_id=slave_sae_id, key_ids=key_ids)
+
+
+@router.post(
+    path="/{master_sae_id}/dec_keys",
+    summary="Get key with key IDs",
+    response_model=KeyContainer,
+    response_model_exclude_none=True
+)
+async def post_key_with_key_i_ds(
+    master_sae_id: UUID,
+    slave_sae_id: UUID,
+    request: KeyIDs
+) -> KeyContainer:
+    """
+    API to get the Keys for the calling slave SAE, with their IDs in the body.
+    """
+    return await __get_keys(
+        master_sae_id=master_sae_id, slave_sae_id=slave_sae_id, key_ids=[k.key_ID for k in request.key_IDs]
+    )
+
+
+async def __get_keys(master_sae_id: UUID, slave_sae_id: UUID, key_ids: list[UUID]) -> KeyContainer:
+    if len(key_ids) > Config.MAX_KEY_PER_REQUEST:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {Config.MAX_KEY_PER_REQUEST} keys per request"
+        )
+    if len(set(key_ids)) < len(key_ids):
+        # each key is retrieved only once, releasing its blocks once
+        raise HTTPException(
+            status_code=400,
+            detail="Duplicate key IDs in the request"
+        )
     ksid: orm.Ksid = await dbms_get_ksid(slave_sae_id=slave_sae_id, master_sae_id=master_sae_id)
     if not ksid.relay:
-        kc = await dbms_get_key_direct(key_id=key_ids)
+        keys = await dbms_get_keys_direct(key_ids=key_ids)
     else:
-        kc = await dbms_get_relayed_key(key_id=key_ids)
-    return kc
+        keys = await dbms_get_relayed_keys(key_ids=key_ids)
+    return KeyContainer(keys=tuple(k.encode() for k in keys))
@@ -8,14 +8,15 @@ from fastapi import APIRouter, Query, HTTPException
 from sd_qkd_node.configs import Config
 from sd_qkd_node.database import orm
 from sd_qkd_node.database.dbms import dbms_get_kme_address, dbms_get_ksid, get_local_key, dbms_generate_keys_direct, \
-    dbms_generate_keys_relay, dbms_generate_encryption_key_for_relay
+    dbms_generate_keys_relay, dbms_generate_encryption_key_for_relay, dbms_save_local_keys, relay_locks
+from sd_qkd_node.database.replenisher import keys_served
 from sd_qkd_node.external_api import kme_api_key_relay, kme_api_exchange_key
-from sd_qkd_node.model import Key
+from sd_qkd_node.model import Key, RawKey
 from sd_qkd_node.model.errors import BlockNotFound
 from sd_qkd_node.model.exchange_key import ExchangeKeyRequest
 from sd_qkd_node.model.key_container import KeyContainer
 from sd_qkd_node.model.key_relay import KeyRelayRequest, KeyRelayResponse
-from sd_qkd_node.utils import encrypt_key
+from sd_qkd_node.utils import encrypt_keys
 
 
 router: Final[APIRouter] = APIRouter(tags=["enc_keys"])
@@ -30,21 +31,22 @@ router: Final[APIRouter] = APIRouter(tags=["enc_keys"])
 async def get_key(
         slave_sae_id: UUID,
         master_sae_id: UUID,
-        number: int = Query(default=1, description="Number of keys requested", ge=1),
+        number: int = Query(
+            default=1, description="Number of keys requested", ge=1, le=Config.MAX_KEY_PER_REQUEST
+        ),
         size: int = Query(default=64, description="Size of each key in bits", ge=1)
 ) -> KeyContainer | None:
     """
     API to get the Key for the calling master SAE. Starts the key relay if needed.
     """
-    # TODO number param not implemented
     logging.getLogger().warning(f"start enc_keys [[...{str(master_sae_id)[25:]} -> ...{str(slave_sae_id)[25:]}]]")
     ksid: orm.Ksid = await dbms_get_ksid(slave_sae_id=slave_sae_id, master_sae_id=master_sae_id)
     kc: KeyContainer
     try:
         if ksid.relay:
-            kc = await __get_key_relay(ksid=ksid, size=size)
+            kc = await __get_key_relay(ksid=ksid, size=size, number=number)
         else:
-            kc = await __get_key_direct(ksid=ksid, size=size)
+            kc = await __get_key_direct(ksid=ksid, size=size, number=number)
     except BlockNotFound:
         raise HTTPException(
             status_code=500,
@@ -54,92 +56,118 @@ async def get_key(
     return kc
 
 
-async def __get_key_direct(ksid: orm.Ksid, size: int) -> KeyContainer:
-    new_key: Key | None = None
+async def __get_key_direct(ksid: orm.Ksid, size: int, number: int) -> KeyContainer:
+    new_keys: list[RawKey] = []
     if environ.get("qkp") == "yes":
-        # gets key generated ahead and stored locally
+        # gets keys generated ahead and stored locally, refilled in background
         logging.getLogger().info("QKP: Searching local keys")
-        new_key = await get_local_key(ksid=ksid.ksid)
-        if new_key is None:
-            logging.getLogger().info("QKP: No local key, generating new ones")
-            # generates Config.FUTURE_KEYS + 1 keys, 1 stored on the shared db and returned,
-            # while the others stored locally AND on the shared db:
-            # - locally to exploit get_local_key on master kme
-            # - on shared db to make the slave kme retrieve the instructions
-            new_key = await dbms_generate_keys_direct(ksid=ksid, size=size, local=True)
+        new_keys = await __get_local_keys(ksid=ksid, number=number)
+        hits = len(new_keys)
+        if hits < number:
+            logging.getLogger().info("QKP: Not enough local keys, generating the missing ones")
+            # the missing keys are stored on the shared db and returned
+            new_keys.extend(await dbms_generate_keys_direct(ksid=ksid, size=size, number=number - hits))
+        keys_served(ksid=ksid, size=size, hits=hits, misses=number - hits, refill=__refill_keys_direct)
     else:
-        # generates and return 1 key stored on the shared db
-        logging.getLogger().info("NO QKP: generating new key")
-        new_key = await dbms_generate_keys_direct(ksid=ksid, size=size, local=False)
-    return KeyContainer(keys=tuple([new_key]))
+        # generates and return 'number' keys stored on the shared db
+        logging.getLogger().info("NO QKP: generating new keys")
+        new_keys = await dbms_generate_keys_direct(ksid=ksid, size=size, number=number)
+    return KeyContainer(keys=tuple(k.encode() for k in new_keys))
 
 
-async def __get_key_relay(ksid: orm.Ksid, size: int) -> KeyContainer | None:
-    new_key: Key | None = None
-    future_keys: list[Key] = []
+async def __refill_keys_direct(ksid: orm.Ksid, size: int, number: int) -> None:
+    """Generates 'number' future keys, stored locally AND on the shared db:
+    - locally to exploit get_local_key on master kme
+    - on shared db to make the slave kme retrieve the instructions
+    """
+    await dbms_generate_keys_direct(ksid=ksid, size=size, number=0, ahead=number)
+
+
+async def __get_local_keys(ksid: orm.Ksid, number: int) -> list[RawKey]:
+    """Gets at most 'number' keys generated ahead and stored locally."""
+    keys: list[RawKey] = []
+    while len(keys) < number and (key := await get_local_key(ksid=ksid.ksid)) is not None:
+        keys.append(key)
+    return keys
+
+
+async def __get_key_relay(ksid: orm.Ksid, size: int, number: int) -> KeyContainer | None:
+    local_keys: list[RawKey] = []
+    new_keys: list[RawKey] = []
     first = ksid.kme_src == Config.KME_ID
     # if not first:
     #    await dbms_generate_encryption_key_for_relay(ksid=ksid, size=size)
     if environ.get("qkp") == "yes":
-        # gets key generated ahead and stored locally
+        # gets key generated ahead and stored locally, refilled in background
         logging.getLogger().info("QKP: Searching local keys (relay)")
-        new_key = await get_local_key(ksid=ksid.ksid)
-        if new_key is None:
-            # generates and return Config.FUTURE_KEYS + 1 keys,
-            # the first Config.FUTURE_KEYS stored locally ('future_keys')
-            # the last ('new_key') is the one that will be immediately returned, thus not even stored
-            logging.getLogger().info("QKP: No local key, generating new ones (relay)")
-            new_key, future_keys = await dbms_generate_keys_relay(ksid=ksid, size=size, local=True)
-        else:
-            return KeyContainer(keys=tuple([new_key]))
+        local_keys = await __get_local_keys(ksid=ksid, number=number)
+        hits = len(local_keys)
+        if hits < number:
+            # generates the missing keys, that will be immediately returned, thus not even stored
+            logging.getLogger().info("QKP: Not enough local keys, generating the missing ones (relay)")
+            new_keys = await dbms_generate_keys_relay(ksid=ksid, size=size, number=number - hits)
     else:
-        logging.getLogger().info("NO QKP: generating new key (relay)")
-        # generates only one key that is not even stored since is returned immediately
-        new_key = await dbms_generate_keys_relay(ksid=ksid, size=size, local=False)
-    # if it comes to this point means that new keys have been generated together with encryption keys chain,
-    # so they must be relayed
-    # await dbms_generate_encryption_key_for_relay(ksid=ksid, size=size)
+        logging.getLogger().info("NO QKP: generating new keys (relay)")
+        # generates only the keys requested, not even stored since they are returned immediately
+        new_keys = await dbms_generate_keys_relay(ksid=ksid, size=size, number=number)
+    if new_keys:
+        # new keys have been generated together with encryption keys chain, so they must be relayed
+        # await dbms_generate_encryption_key_for_relay(ksid=ksid, size=size)
+        next_kme_addr = await dbms_get_kme_address(dst=ksid.kme_dst)
+        # await kme_api_enc_key(ksid.src, ksid.dst, next_kme_addr, size)
+        # if first:
+        await __start_relay(ksid=ksid, size=size, future_keys=[], new_keys=new_keys, next_kme_addr=next_kme_addr)
+    if environ.get("qkp") == "yes":
+        keys_served(ksid=ksid, size=size, hits=len(local_keys), misses=len(new_keys), refill=__refill_keys_relay)
+    return KeyContainer(keys=tuple(k.encode() for k in local_keys + new_keys))
+
+
+async def __refill_keys_relay(ksid: orm.Ksid, size: int, number: int) -> None:
+    """Generates 'number' future keys and relays them, storing them locally only after the last KME has them."""
+    future_keys = await dbms_generate_keys_relay(ksid=ksid, size=size, number=number)
     next_kme_addr = await dbms_get_kme_address(dst=ksid.kme_dst)
-    # await kme_api_enc_key(ksid.src, ksid.dst, next_kme_addr, size)
-    # if first:
-    await __start_relay(
-        ksid=ksid, size=size, future_keys=future_keys, new_key=new_key, next_kme_addr=next_kme_addr
-    )
-    return KeyContainer(keys=tuple([new_key]))
-
-
-async def __start_relay(ksid: orm.Ksid, size: int, future_keys: list[Key], new_key: Key, next_kme_addr: str) -> None:
-    key_copies: list[Key] = []
-    # gets the enc key generated by the second node
-    # enc_key: Final[Key] = await dbms_get_encryption_key(ksid=ksid)
-    enc_key: Key = await dbms_generate_encryption_key_for_relay(ksid=ksid, size=size)
-    # logging.getLogger().error(f"GENERATED ENC KEY {enc_key.key}")
-    # encrypt_key(key_to_enc=enc_key, enc_key=enc_key)
-    req: KeyRelayRequest = KeyRelayRequest(
-        keys=Key(key_ID=UUID('00000000-0000-0000-0000-000000000000'), key=""), ksid=ksid.ksid, size=size
-    )
-    res: KeyRelayResponse = await kme_api_key_relay(request=req, next_kme_addr=next_kme_addr)
-    if res.addr == "":
-        raise HTTPException(
-            status_code=500,
-            detail="Internal error."
+    await __start_relay(ksid=ksid, size=size, future_keys=future_keys, new_keys=[], next_kme_addr=next_kme_addr)
+    await dbms_save_local_keys(ksid=ksid, keys=future_keys)
+
+
+async def __start_relay(
+        ksid: orm.Ksid, size: int, future_keys: list[RawKey], new_keys: list[RawKey], next_kme_addr: str
+) -> None:
+    """Relays an encryption key along the chain to the last KME, then sends it the keys encrypted.
+
+    The encryption key has 'size' bits for each key, and each key is encrypted with its own slice
+    of it: the same bits are never used for two keys. The relays of a ksid are serialized, from the
+    request path and from the background refill: the KMEs along the chain look up the keys by ksid.
+    """
+    async with relay_locks[ksid.ksid]:
+        # gets the enc key generated by the second node
+        # enc_key: Final[Key] = await dbms_get_encryption_key(ksid=ksid)
+        relay_size = size * len(future_keys + new_keys)
+        enc_key: RawKey = await dbms_generate_encryption_key_for_relay(ksid=ksid, size=relay_size)
+        # logging.getLogger().error(f"GENERATED ENC KEY {enc_key.key}")
+        # encrypt_key(key_to_enc=enc_key, enc_key=enc_key)
+        req: KeyRelayRequest = KeyRelayRequest(
+            keys=Key(key_ID=UUID('00000000-0000-0000-0000-000000000000'), key=""), ksid=ksid.ksid, size=relay_size
         )
-    # logging.getLogger().error(f"THE LAST KME ADDR IS {res.addr}")
-    # TODO probably also the key_id should be encrypted to avoid leak of any type
-    logging.getLogger().info(f"AAAAA ENCRYPTION KEY {enc_key.key}")
-    if environ.get("qkp") == "yes":
-        logging.getLogger().info("QKP: encrypting keys (relay)")
-        for k in future_keys:
-            logging.getLogger().info(f"KEY TO BE ENCRYPTED {k.key}")
-            key_copies.append(encrypt_key(key_to_enc=k, enc_key=enc_key))
-            logging.getLogger().info(f"KEY JUST ENCRYPTED {key_copies[-1].key}")
-    else:
-        logging.getLogger().info("NO QKP: encrypting key (relay)")
-    logging.getLogger().info(f"KEY TO BE ENCRYPTED {new_key.key}")
-    key_copies.append(encrypt_key(key_to_enc=new_key, enc_key=enc_key))
-    logging.getLogger().info(f"KEY JUST ENCRYPTED {key_copies[-1].key}")
-    request: ExchangeKeyRequest = ExchangeKeyRequest(
-        ksid=ksid.ksid, size=size, keys=KeyContainer(keys=tuple(key_copies))
-    )
-    await kme_api_exchange_key(kme_addr=res.addr, request=request)
+        res: KeyRelayResponse = await kme_api_key_relay(request=req, next_kme_addr=next_kme_addr)
+        if res.addr == "":
+            raise HTTPException(
+                status_code=500,
+                detail="Internal error."
+            )
+        # logging.getLogger().error(f"THE LAST KME ADDR IS {res.addr}")
+        # TODO probably also the key_id should be encrypted to avoid leak of any type
+        logging.getLogger().info(f"AAAAA ENCRYPTION KEY {enc_key.key}")
+        if environ.get("qkp") == "yes":
+            logging.getLogger().info("QKP: encrypting keys (relay)")
+        else:
+            logging.getLogger().info("NO QKP: encrypting key (relay)")
+        # future_keys is empty without QKP
+        key_copies: list[RawKey] = encrypt_keys(keys_to_enc=future_keys + new_keys, enc_key=enc_key)
+        logging.getLogger().info(f"KEYS JUST ENCRYPTED {[k.key for k in key_copies]}")
+        request: ExchangeKeyRequest = ExchangeKeyRequest(
+            ksid=ksid.ksid, size=size, keys=KeyContainer(keys=tuple(k.encode() for k in key_copies)),
+            relay_key_ID=enc_key.key_ID
+        )
+        await kme_api_exchange_key(kme_addr=res.addr, request=request)
 
@@ -8,10 +8,11 @@ from sd_qkd_node.database import orm
 from sd_qkd_node.database.dbms import dbms_get_kme_address, dbms_save_relayed_key, \
     dbms_get_ksid, dbms_get_decryption_key, dbms_get_encryption_key, dbms_generate_encryption_key_for_relay
 from sd_qkd_node.external_api import kme_api_key_relay
+from sd_qkd_node.model import RawKey
 from sd_qkd_node.model.exchange_key import ExchangeKeyRequest
-from sd_qkd_node.model.key_container import KeyContainer, Key
+from sd_qkd_node.model.key_container import KeyContainer
 from sd_qkd_node.model.key_relay import KeyRelayRequest
-from sd_qkd_node.utils import encrypt_key, decrypt_key
+from sd_qkd_node.utils import decrypt_keys
 
 
 router: Final[APIRouter] = APIRouter(tags=["exchange_key"])
@@ -30,9 +31,12 @@ async def exchange_key(
     API to relay a key to the next-hop KME.
     """
     ksid: orm.Ksid = await dbms_get_ksid(ksid=request.ksid)
-    decryption_key: Final[Key] = await dbms_get_encryption_key(ksid=ksid)
+    decryption_key: Final[RawKey] = await dbms_get_encryption_key(ksid=ksid, key_id=request.relay_key_ID)
     logging.getLogger().info(f"AAAAA DECRYPTION KEY {decryption_key.key}")
-    for k in request.keys.keys:
-        logging.getLogger().info(f"KEY RECEIVED {k.key}")
-        await dbms_save_relayed_key(ksid=ksid, keys=decrypt_key(key_to_dec=k, dec_key=decryption_key))
-        logging.getLogger().info(f"DECRYTPED AND STORED KEY {decrypt_key(key_to_dec=k, dec_key=decryption_key).key}")
+    logging.getLogger().info(f"KEYS RECEIVED {[k.key for k in request.keys.keys]}")
+    keys: list[RawKey] = decrypt_keys(
+        keys_to_dec=[RawKey.decode(k) for k in request.keys.keys], dec_key=decryption_key
+    )
+    for k in keys:
+        await dbms_save_relayed_key(ksid=ksid, keys=k)
+        logging.getLogger().info(f"DECRYTPED AND STORED KEY {k.key}")
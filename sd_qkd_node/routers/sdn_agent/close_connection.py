@@ -6,6 +6,7 @@ from fastapi import APIRouter
 from sd_qkd_node.configs import Config
 from sd_qkd_node.database import orm
 from sd_qkd_node.database.dbms import dbms_delete_ksid, dbms_get_ksid
+from sd_qkd_node.database.replenisher import remove_replenisher
 from sd_qkd_node.external_api import agent_api_close_connection
 
 router: Final[APIRouter] = APIRouter(tags=["close_connection"])
@@ -25,6 +26,7 @@ async def close_connection(
     """
     ksid_to_del: Final[orm.Ksid] = await dbms_get_ksid(ksid=ksid)
     first, last, next_kme_addr = await dbms_delete_ksid(ksid_to_del=ksid_to_del)
+    await remove_replenisher(ksid)
     if first:
         await agent_api_close_connection(Config.SDN_CONTROLLER_ADDRESS, ksid)
     if not last:
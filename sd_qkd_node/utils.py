@@ -1,68 +1,65 @@
 """Utility functions."""
-from base64 import b64decode, b64encode
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Collection
+from itertools import accumulate
+from typing import Final
 
-from sd_qkd_node.model import Key
+import numpy
 
+from sd_qkd_node.model import RawKey
 
-def b64_to_tupleint(b64_string: str) -> tuple[int, ...]:
-    """Converts a base64 string into a tuple of integer in [0, 255]."""
-    assert is_base64(b64_string)
-    return tuple(b for b in b64decode(b64_string))
+# Keys shorter than this, in bytes, are XORed one at a time, since joining them for NumPy costs more than it saves.
+XOR_BATCH_MIN_SIZE: Final[int] = 256
 
 
-def collectionint_to_b64(c: Collection[int]) -> str:
-    """Converts a collection of integer in [0, 255] into a base64 string."""
-    assert all(n in range(0, 256) for n in c)
-    return str(b64encode(bytes(c)), "utf-8")
+def now() -> int:
+    """Returns the actual timestamp as an integer."""
+    return int(datetime.now().timestamp())
 
 
-def bit_length(c: Collection[int]) -> int:
-    """Returns number of bits represented by the given collection of integer.
+def xor_keys(keys: Sequence[RawKey], pad: RawKey) -> list[RawKey]:
+    """Returns the bitwise XOR of each key with its own slice of the pad, keeping the key IDs.
 
-    Each positive integer number is considered 8-bits long, in range [0, 255].
+    The keys take the bytes of the pad in order, so no byte is used for two keys: the pad must be
+    at least as long as all the keys together. They are joined in a single buffer, XORed at once
+    with the pad, unless shorter than XOR_BATCH_MIN_SIZE.
     """
-    assert all(n in range(0, 256) for n in c)
-    return len(c) * 8
+    offsets = list(accumulate((len(k.key) for k in keys), initial=0))
+    if len(pad.key) < offsets[-1]:
+        raise ValueError(f"Pad of {len(pad.key)} bytes too short for keys of {offsets[-1]} bytes")
+    if offsets[-1] < XOR_BATCH_MIN_SIZE * len(keys):
+        return [
+            xor_key(k, RawKey(key_ID=pad.key_ID, key=pad.key[start:end]))
+            for k, start, end in zip(keys, offsets, offsets[1:])
+        ]
+    buffer = numpy.frombuffer(b"".join(k.key for k in keys), dtype=numpy.uint8)
+    xored = (buffer ^ numpy.frombuffer(pad.key, dtype=numpy.uint8, count=offsets[-1])).tobytes()
+    return [RawKey(key_ID=k.key_ID, key=xored[start:end]) for k, start, end in zip(keys, offsets, offsets[1:])]
 
 
-def bit_length_b64(b64_string: str) -> int:
-    """Returns the number of bits represented by the given base64 string."""
-    assert is_base64(b64_string)
-    return bit_length(b64_to_tupleint(b64_string))
+def xor_key(key: RawKey, pad: RawKey) -> RawKey:
+    """Returns the bitwise XOR of a single key with the pad, as integers."""
+    if len(key.key) != len(pad.key):
+        raise ValueError(f"Keys to XOR must be {len(pad.key)} bytes long")
+    xored = int.from_bytes(key.key, "big") ^ int.from_bytes(pad.key, "big")
+    return RawKey(key_ID=key.key_ID, key=xored.to_bytes(len(key.key), "big"))
 
 
-def is_base64(s: str) -> bool:
-    """Returns True if 's' is a valid base64 string, else False."""
-    bytes_s = bytes(s, "ascii")
-    return bytes_s == b64encode(b64decode(bytes_s))
+def encrypt_keys(keys_to_enc: Sequence[RawKey], enc_key: RawKey) -> list[RawKey]:
+    """Encrypts many keys making the bitwise XOR with their slices of the key relay."""
+    return xor_keys(keys_to_enc, enc_key)
 
 
-def now() -> int:
-    """Returns the actual timestamp as an integer."""
-    return int(datetime.now().timestamp())
+def decrypt_keys(keys_to_dec: Sequence[RawKey], dec_key: RawKey) -> list[RawKey]:
+    """Decrypts many keys making the bitwise XOR with their slices of the key relay."""
+    return xor_keys(keys_to_dec, dec_key)
 
 
-def encrypt_key(key_to_enc: Key, enc_key: Key) -> Key:
+def encrypt_key(key_to_enc: RawKey, enc_key: RawKey) -> RawKey:
     """Encrypts a key making the bitwise XOR with the key relay."""
-    key_to_encrypt: tuple[int, ...] = b64_to_tupleint(key_to_enc.key)
-    encryption_key: tuple[int, ...] = b64_to_tupleint(enc_key.key)
-    bytes_list: list[int] = []
-    for i in range(0, len(key_to_encrypt)):
-        bytes_list.append(key_to_encrypt[i] ^ encryption_key[i])
-    encrypted_key: tuple[int, ...] = tuple(bytes_list)
-    key = collectionint_to_b64(encrypted_key)
-    return Key(key_ID=key_to_enc.key_ID, key=key)
+    return xor_key(key_to_enc, enc_key)
 
 
-def decrypt_key(key_to_dec: Key, dec_key: Key) -> Key:
+def decrypt_key(key_to_dec: RawKey, dec_key: RawKey) -> RawKey:
     """Decrypts a key making the bitwise XOR with the key relay."""
-    key_to_decrypt: tuple[int, ...] = b64_to_tupleint(key_to_dec.key)
-    decryption_key: tuple[int, ...] = b64_to_tupleint(dec_key.key)
-    bytes_list: list[int] = []
-    for i in range(0, len(key_to_decrypt)):
-        bytes_list.append(decryption_key[i] ^ key_to_decrypt[i])
-    decrypted_key: tuple[int, ...] = tuple(bytes_list)
-    key = collectionint_to_b64(decrypted_key)
-    return Key(key_ID=key_to_dec.key_ID, key=key)
+    return xor_key(key_to_dec, dec_key)
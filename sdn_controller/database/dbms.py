@@ -123,6 +123,17 @@ async def dbms_update_link(link_id: uuid.UUID, rate: float) -> None:
         update_rate((link.kme1, link.kme2), new_rate=rate)
 
 
+async def dbms_update_links(rates: dict[uuid.UUID, float]) -> None:
+    """Updates the rates of multiple links, skipping the ones not confirmed by both KMEs yet."""
+    async with link_lock:
+        links: list[orm.Link] = await orm.Link.objects.filter(link_id__in=list(rates)).all()
+        for link in links:
+            if link.kme2 is None:
+                continue
+            await link.update(rate=rates[link.link_id])
+            update_rate((link.kme1, link.kme2), new_rate=rates[link.link_id])
+
+
 async def delete_ksid(ksid: uuid.UUID) -> None:
     """Deletes the Ksid when a SAE closes the connection and frees the rate in the links."""
     try:
@@ -0,0 +1,15 @@
+"""Fields of the ORM models not provided by the orm package."""
+import sqlalchemy
+import typesystem
+from orm.fields import ModelField
+
+
+class Binary(ModelField):
+    """Raw bytes, stored as a BLOB."""
+
+    def get_validator(self, **kwargs) -> typesystem.Field:
+        return typesystem.Any(**kwargs)
+
+    def get_column_type(self) -> sqlalchemy.types.TypeEngine:
+        return sqlalchemy.LargeBinary()
+
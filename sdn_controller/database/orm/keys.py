@@ -1,7 +1,8 @@
 """Representation of a Key inside the database."""
-from orm import Model, Integer, UUID, JSON, Boolean
+from orm import Model, Integer, UUID, Boolean
 
 from sdn_controller.database import shared_models
+from sdn_controller.database.orm.fields import Binary
 
 
 class Key(Model):  # type: ignore
@@ -9,7 +10,7 @@ class Key(Model):  # type: ignore
 
     key_id: UUID
     ksid: UUID
-    instructions: object
+    instructions: bytes
     relay: bool
     link_id: UUID
 
@@ -20,6 +21,6 @@ class Key(Model):  # type: ignore
         "key_id": UUID(unique=True, allow_null=False),
         "ksid": UUID(unique=False, allow_null=False),
         "relay": Boolean(unique=False, default=False),
-        "instructions": JSON(allow_null=False),
+        "instructions": Binary(allow_null=False),
         "link_id": UUID(unique=False, allow_null=True)
     }
@@ -0,0 +1,24 @@
+from typing import Final
+
+from fastapi import APIRouter
+
+from sdn_controller.database.dbms import dbms_update_links
+from sdn_controller.model.update_links import UpdateLinksRequest
+
+
+router: Final[APIRouter] = APIRouter(tags=["update_links"])
+
+
+@router.post(
+    path="/update_links",
+    summary="Update the rates of multiple links",
+    response_model_exclude_none=True,
+    include_in_schema=False
+)
+async def update_links(
+        request: UpdateLinksRequest
+) -> None:
+    """
+    API to update at once the rates of the QC Links of a KME.
+    """
+    await dbms_update_links({link.link_id: link.rate for link in request.links})
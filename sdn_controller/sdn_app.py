@@ -7,7 +7,7 @@ from fastapi.responses import JSONResponse, RedirectResponse
 
 from sdn_controller.database import local_models, shared_models, local_db
 from sdn_controller.model.errors import BadRequest, Unauthorized, ServiceUnavailable
-from sdn_controller.routers import new_app, new_kme, new_link, close_connection, update_link
+from sdn_controller.routers import new_app, new_kme, new_link, close_connection, update_link, update_links
 
 app: Final[FastAPI] = FastAPI(
     debug=True,
@@ -24,6 +24,7 @@ app.include_router(new_kme.router)
 app.include_router(new_link.router)
 app.include_router(close_connection.router)
 app.include_router(update_link.router)
+app.include_router(update_links.router)
 
 
 @app.get("/", include_in_schema=False)
@@ -131,6 +131,13 @@ def set_qcs() -> None:
     shared_params = ["-i", f"1", "-lb", f"33", "-ub", f"47"]
     temp = get_qcs()
     print(f"{Bcolors.BOLD}\nSetting Quantum Channels.{Bcolors.ENDC}")
+    if read_args().single_qcs:
+        # a single process drives all the links, as listed in the simulation file
+        qcs.append(Popen(
+            initial_params + ["-t", os.path.dirname(os.path.abspath(__file__)) + '/simulation.ini', "-n", config[1]]
+            + shared_params
+        ))
+        return
     for ports in temp:
         qcs.append(Popen(
             initial_params + ["-k1", f"127.0.0.1:{ports[0]}", "-k2", f"127.0.0.1:{ports[1]}"] + shared_params
@@ -353,7 +360,7 @@ def start_network() -> None:
         set_sd_qkd_nodes()
         all_created(entities=sd_qkd_nodes, check_str="CTR: KME added")
         set_qcs()
-        all_created(entities=qcs, check_str="CTR: Link added:")
+        all_created(entities=get_qcs(), check_str="CTR: Link added:")
         # To have the qc deliver some bytes
         time.sleep(5)
         set_saes()
@@ -386,6 +393,11 @@ def read_args() -> Namespace:
         help="The network example from the 'simulation.ini' file. Default 'ring'.",
         default="ring",
     )
+    parser.add_argument(
+        "--single-qcs",
+        action="store_true",
+        help="Simulate all the quantum channels in a single process, instead of one process per link.",
+    )
 
     return parser.parse_args()
 